@@ -0,0 +1,155 @@
+"""
+Measures, on a scratch database, the throughput of crud.operations.apply_catalog_refresh
+(the write path of /fetch-insights/refresh and the re-crawl scheduler) and of
+create_brand_insights, the latency of the keyset-paginated product reads behind
+GET /brands/{store}/products, and the throughput of the crud.export bulk export in
+each output format.
+
+    python -m benchmarks.bench_persistence --products 10000
+    python -m benchmarks.bench_persistence --database-url mysql+pymysql://user:pw@localhost/bench
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Callable, List
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from crud import operations
+from crud.export import ExportStats, iter_export
+from models import db_models
+from models.pydantic_models import BrandInsights, Product, ProductVariant
+from scraper.crawl_state import CatalogRefresh, model_hash
+
+# Normalized, as store URLs are in the brands table.
+STORE_URL = "https://bench-store.myshopify.com/"
+
+def _with_price(product: Product, price: float) -> Product:
+    # The price is the first variant's, which is what the content hash covers.
+    return product.model_copy(update={"price": price, "variants": [ProductVariant.model_construct(id=product.id + 1, title="Default Title", price=price, available=True)]})
+
+def make_catalog(product_count: int, price_seed: int = 0) -> List[Product]:
+    rng = random.Random(price_seed)
+    return [
+        _with_price(Product.model_construct(
+            id=7_000_000_000_000 + 2 * i,
+            title=f"Product {i}",
+            vendor=f"Vendor {i % 50}",
+            product_type=("Apparel", "Accessories", "Footwear")[i % 3],
+            url=f"{STORE_URL}products/product-{i}",
+        ), round(rng.uniform(5, 500), 2))
+        for i in range(product_count)
+    ]
+
+def first_crawl(products: List[Product]) -> CatalogRefresh:
+    """What the scraper reports for a store the database has never seen: every product is new."""
+    return CatalogRefresh(changed=products, hashes={product.id: model_hash(product) for product in products})
+
+def repriced(products: List[Product], fraction: float) -> CatalogRefresh:
+    """A re-crawl where roughly `fraction` of the products changed price."""
+    rng = random.Random(1)
+    refresh = CatalogRefresh()
+    for product in products:
+        if rng.random() < fraction:
+            product = _with_price(product, product.price + 1)
+            refresh.changed.append(product)
+        else:
+            refresh.unchanged += 1
+        refresh.hashes[product.id] = model_hash(product)
+    return refresh
+
+def delisted(products: List[Product], fraction: float) -> CatalogRefresh:
+    """A re-crawl where roughly `fraction` of the products disappeared."""
+    rng = random.Random(2)
+    refresh = CatalogRefresh()
+    for product in products:
+        if rng.random() < fraction:
+            refresh.deleted_ids.append(product.id)
+        else:
+            refresh.unchanged += 1
+            refresh.hashes[product.id] = model_hash(product)
+    return refresh
+
+def timed_save(session_factory, save: Callable) -> float:
+    db = session_factory()
+    try:
+        start = time.perf_counter()
+        save(db)
+        return time.perf_counter() - start
+    finally:
+        db.close()
+
+def timed_reads(session_factory, page_size: int) -> None:
+    """Pages through the whole stored catalog, then reads a first page per filter."""
+    db = session_factory()
+    try:
+        brand_id = operations.find_brand(db, [STORE_URL]).id
+        page_times, after = [], None
+        while True:
+            start = time.perf_counter()
+            page = operations.list_brand_products(db, brand_id, after=after, limit=page_size)
+            page_times.append(time.perf_counter() - start)
+            after = page.next_cursor
+            if after is None:
+                break
+        print(f"{'keyset pages':<32} {len(page_times):>8} pages     {sum(page_times) / len(page_times) * 1000:8.2f}ms per page, last {page_times[-1] * 1000:.2f}ms")
+        for label, filters in (
+            ("vendor filter", {"vendor": "Vendor 7"}),
+            ("product_type filter", {"product_type": "Footwear"}),
+            ("price range", {"min_price": 100, "max_price": 120}),
+        ):
+            start = time.perf_counter()
+            page = operations.list_brand_products(db, brand_id, limit=page_size, **filters)
+            print(f"{label:<32} {len(page.products):>8} products  {(time.perf_counter() - start) * 1000:8.2f}ms")
+    finally:
+        db.close()
+
+def timed_exports(engine) -> None:
+    """Exports the products table in every format, then traces peak memory of one NDJSON export."""
+    for format, compress in (("ndjson", False), ("ndjson", True), ("csv", False), ("csv", True)):
+        stats = ExportStats()
+        for _ in iter_export("products", format, compress, bind=engine, stats=stats):
+            pass
+        label = f"export {format}{' gzip' if compress else ''}"
+        print(f"{label:<32} {stats.rows:>8} products  {stats.bytes / 1e6:7.1f}MB  {stats.rows_per_second:>12,.0f} rows/s")
+    tracemalloc.start()
+    try:
+        for _ in iter_export("products", bind=engine):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    print(f"{'export peak traced memory':<32} {peak / 1e6:7.2f}MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--database-url", default="sqlite:///:memory:")
+    parser.add_argument("--changed-fraction", type=float, default=0.1)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    db_models.Base.metadata.drop_all(bind=engine)
+    db_models.Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    products = make_catalog(args.products)
+    runs = [
+        ("first save", first_crawl(products)),
+        (f"refresh, {args.changed_fraction:.0%} repriced", repriced(products, args.changed_fraction)),
+        (f"refresh, {args.changed_fraction:.0%} delisted", delisted(products, args.changed_fraction)),
+    ]
+    for label, refresh in runs:
+        elapsed = timed_save(session_factory, lambda db: operations.apply_catalog_refresh(db, STORE_URL, refresh))
+        written = len(refresh.changed) + len(refresh.deleted_ids)
+        print(f"{label:<32} {written:>8} products  {elapsed:8.3f}s  {written / elapsed:>12,.0f} rows/s")
+    # A full scrape saved again: every product is compared by hash, the unchanged ones aren't written.
+    insights = BrandInsights(store_url=STORE_URL, product_catalog=products)
+    elapsed = timed_save(session_factory, lambda db: operations.create_brand_insights(db, insights))
+    print(f"{'full insights save':<32} {len(products):>8} products  {elapsed:8.3f}s  {len(products) / elapsed:>12,.0f} rows/s")
+    timed_reads(session_factory, args.page_size)
+    timed_exports(engine)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Simulates the re-crawl scheduler's interval policy against fixed-interval polling.
+
+    python -m benchmarks.bench_scheduler
+    python -m benchmarks.bench_scheduler --stores 2000 --days 60 --fixed-hours 1 6 24
+
+Each store's catalog changes as a Poisson process whose mean time between changes is
+drawn log-uniformly from --change-hours. Every policy crawls the same change
+timelines. The report gives crawls per store per day, the share of crawls that found
+a change (every other crawl spent upstream requests on nothing new), the share of
+time a store's stored copy was up to date, and how long a change waited to be
+picked up.
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import argparse
+import bisect
+import json
+import math
+import random
+from typing import Callable, List
+from jobs.scheduler import RECRAWL_INITIAL_INTERVAL, RECRAWL_MAX_INTERVAL, RECRAWL_MIN_INTERVAL, jittered, next_interval
+
+def change_timeline(rng: random.Random, mean_gap: float, horizon: float) -> List[float]:
+    changes, t = [], rng.expovariate(1 / mean_gap)
+    while t < horizon:
+        changes.append(t)
+        t += rng.expovariate(1 / mean_gap)
+    return changes
+
+def simulate(changes: List[float], horizon: float, next_delay: Callable[[float, bool], float], first_delay: float) -> dict:
+    """Crawls one store until `horizon`; `next_delay(previous_delay, changed)` picks each wait."""
+    crawls, useful, stale_time, delays = 0, 0, 0.0, []
+    t = delay = first_delay
+    previous = 0.0
+    while t < horizon:
+        crawls += 1
+        lo, hi = bisect.bisect_right(changes, previous), bisect.bisect_right(changes, t)
+        if hi > lo:
+            useful += 1
+            # The copy went stale at the first change after the last crawl.
+            stale_time += t - changes[lo]
+            delays.extend(t - change for change in changes[lo:hi])
+        previous = t
+        delay = next_delay(delay, hi > lo)
+        t += delay
+    if bisect.bisect_right(changes, previous) < len(changes):
+        stale_time += horizon - changes[bisect.bisect_right(changes, previous)]
+    return {"crawls": crawls, "useful": useful, "stale_time": stale_time, "delays": delays}
+
+def summarise(runs: List[dict], horizon: float) -> dict:
+    days = horizon / 86400
+    crawls = sum(run["crawls"] for run in runs)
+    fresh = 1 - sum(run["stale_time"] for run in runs) / (len(runs) * horizon)
+    delays = sorted(delay for run in runs for delay in run["delays"])
+    return {
+        "crawls_per_store_day": round(crawls / len(runs) / days, 2),
+        "useful_crawl_share": round(sum(run["useful"] for run in runs) / crawls, 4) if crawls else None,
+        "fresh_share": round(fresh, 4),
+        "median_detection_h": round(delays[len(delays) // 2] / 3600, 2) if delays else None,
+        "p95_detection_h": round(delays[int(len(delays) * 0.95)] / 3600, 2) if delays else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stores", type=int, default=1000)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--change-hours", type=float, nargs=2, default=[1, 24 * 30], help="range of mean hours between a store's catalog changes")
+    parser.add_argument("--fixed-hours", type=float, nargs="+", default=[1, 3, 6, 24], help="fixed polling intervals to compare against")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_scheduler.json")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    horizon = args.days * 86400
+    low, high = (math.log(hours * 3600) for hours in args.change_hours)
+    timelines = [change_timeline(rng, math.exp(rng.uniform(low, high)), horizon) for _ in range(args.stores)]
+
+    policies = {f"fixed {hours:g}h": (lambda delay, changed, interval=hours * 3600: interval, hours * 3600) for hours in args.fixed_hours}
+    # The scheduler keeps the un-jittered interval; jitter only shifts each crawl.
+    state = {}
+    def adaptive(delay: float, changed: bool) -> float:
+        state["interval"] = next_interval(state["interval"], changed)
+        return jittered(state["interval"])
+    policies["adaptive"] = (adaptive, RECRAWL_INITIAL_INTERVAL)
+
+    results = {"config": vars(args), "min_interval": RECRAWL_MIN_INTERVAL, "max_interval": RECRAWL_MAX_INTERVAL, "policies": {}}
+    for name, (next_delay, first_delay) in policies.items():
+        runs = []
+        for changes in timelines:
+            state["interval"] = RECRAWL_INITIAL_INTERVAL
+            runs.append(simulate(changes, horizon, next_delay, first_delay))
+        results["policies"][name] = summarise(runs, horizon)
+        print(f"{name:<12} {json.dumps(results['policies'][name])}")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Benchmarks ShopifyScraper against the local fixture store (benchmarks/fixture_store.py).
+
+    python -m benchmarks.bench_scraper
+    python -m benchmarks.bench_scraper --products 100 10000 --scrapes 20 --concurrency 8 --latency 0.02
+    python -m benchmarks.bench_scraper --throttle-rate 0.05 --output after.json --compare before.json
+
+For each catalog size, ShopifyScraper.run() and the /fetch-insights/ endpoint each
+scrape `--scrapes` distinct stores, `--concurrency` at a time. The report gives
+p50/p95 latency, stores per second and peak RSS, plus the CPU time of each extractor
+on the fixture's pages. The fixture server runs in this process, so its CPU and
+memory are included. Peak RSS never goes down, so sizes run smallest first.
+"""
+import os
+
+# Measure the scraper rather than the politeness limits or the response cache: every
+# fixture store shares one host. Anything set in the environment still wins.
+os.environ.setdefault("RATE_LIMIT_PER_HOST", "0")
+os.environ.setdefault("HTTP_MAX_CONNECTIONS_PER_HOST", "64")
+os.environ.setdefault("CACHE_MAX_BYTES", "0")
+os.environ.setdefault("SCRAPE_TIMEOUT", "600")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# Don't leave price snapshot files behind, and keep re-crawls from competing with the scrapes measured.
+os.environ.setdefault("PRICE_HISTORY_DIR", "")
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Awaitable, Callable, List
+import httpx
+from benchmarks.fixture_store import FixtureStore, PRODUCTS_PAGE_MAX
+from scraper.extractor import HTML_PARSER, parse_contacts, parse_faqs, parse_homepage
+from scraper.http_client import create_http_client
+from scraper.parse_pool import PARSE_WORKERS, create_parse_pool
+from scraper.scraper import ShopifyScraper
+from scraper.themes import ExtractionPlans, detect_theme
+
+# Every scrape gets a store nobody has scraped yet, so nothing is coalesced or cached.
+_store_ids = itertools.count()
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of `values`, 0 <= q <= 100."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))]
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+async def time_scrapes(scrape: Callable[[str], Awaitable[dict]], fixture: FixtureStore, args) -> dict:
+    """Runs `scrape` over fresh stores and summarises latency, throughput and completeness."""
+    slots = asyncio.Semaphore(args.concurrency)
+    latencies, failures, incomplete = [], 0, 0
+
+    async def one(url: str):
+        nonlocal failures, incomplete
+        async with slots:
+            start = time.perf_counter()
+            try:
+                insights = await scrape(url)
+            except Exception:
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - start)
+            if len(insights["product_catalog"]) != fixture.products or insights.get("degraded_sections"):
+                incomplete += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(fixture.url(next(_store_ids))) for _ in range(args.scrapes)))
+    elapsed = time.perf_counter() - start
+    return {
+        "scrapes": args.scrapes,
+        "failures": failures,
+        "incomplete": incomplete,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        "stores_per_s": round(len(latencies) / elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+async def bench_run(fixture: FixtureStore, args) -> dict:
+    parse_pool = create_parse_pool()
+    extraction_plans = ExtractionPlans()
+    try:
+        async with create_http_client() as client:
+            async def scrape(url: str) -> dict:
+                insights = await ShopifyScraper(url, client=client, parse_pool=parse_pool, extraction_plans=extraction_plans).run()
+                return {"product_catalog": insights.product_catalog, "degraded_sections": insights.degraded_sections}
+            return await time_scrapes(scrape, fixture, args)
+    finally:
+        if parse_pool is not None:
+            parse_pool.shutdown()
+
+async def bench_endpoint(fixture: FixtureStore, args) -> dict:
+    from main import app
+    # main configures INFO logging, which would log every request we make.
+    logging.getLogger().setLevel(logging.WARNING)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as api:
+            async def scrape(url: str) -> dict:
+                response = await api.post("/fetch-insights/", json={"website_url": url})
+                response.raise_for_status()
+                return response.json()
+            return await time_scrapes(scrape, fixture, args)
+
+def extractor_cpu(fixture: FixtureStore, repeat: int) -> dict:
+    """CPU milliseconds per call of each extractor, run inline on the fixture's pages."""
+    def cpu_ms(func, *func_args) -> float:
+        start = time.process_time()
+        for _ in range(repeat):
+            func(*func_args)
+        return round((time.process_time() - start) * 1000 / repeat, 3)
+
+    base_url = fixture.url(0)
+    homepage, faq_page = fixture.page("/stores/0/"), fixture.page("/stores/0/pages/faq")
+    # The fixture's theme, with and without the FAQ layout a previous scrape learned.
+    plans = ExtractionPlans()
+    plan = plans.plan(base_url, detect_theme(homepage))
+    plans.learn(base_url, plan, parse_faqs(faq_page, plan).layout)
+    timings = {
+        "parse_homepage": cpu_ms(parse_homepage, homepage, base_url, plan),
+        "parse_contacts": cpu_ms(parse_contacts, fixture.page("/stores/0/pages/contact")),
+        "parse_faqs": cpu_ms(parse_faqs, faq_page),
+        "parse_faqs_learned": cpu_ms(parse_faqs, faq_page, plans.plan(base_url, plan.theme)),
+    }
+
+    # The whole catalog, decoded and validated one page at a time as run() does.
+    scraper = ShopifyScraper(base_url)
+    catalog_cpu = 0.0
+    for page in range(1, -(-fixture.products // PRODUCTS_PAGE_MAX) + 1):
+        content = fixture.products_page({"page": [str(page)], "limit": [str(PRODUCTS_PAGE_MAX)]})
+        start = time.process_time()
+        scraper._parse_products(json.loads(content)["products"])
+        catalog_cpu += time.process_time() - start
+    timings["parse_catalog"] = round(catalog_cpu * 1000, 3)
+    return timings
+
+def catalog_memory(fixture: FixtureStore) -> dict:
+    """Bytes per parsed Product, retained and at peak, while a whole catalog is held in memory."""
+    scraper = ShopifyScraper(fixture.url(0))
+    pages = [
+        fixture.products_page({"page": [str(page)], "limit": [str(PRODUCTS_PAGE_MAX)]})
+        for page in range(1, -(-fixture.products // PRODUCTS_PAGE_MAX) + 1)
+    ]
+    tracemalloc.start()
+    try:
+        catalog = [product for content in pages for product in scraper._parse_products(json.loads(content)["products"])]
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"retained_bytes_per_product": round(retained / len(catalog)), "peak_bytes_per_product": round(peak / len(catalog))}
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parse_workers": PARSE_WORKERS,
+        "html_parser": HTML_PARSER,
+    }
+
+def compare(results: dict, baseline: dict) -> None:
+    """Prints how each metric moved against a previous --output file."""
+    previous = {entry["products"]: entry for entry in baseline["results"]}
+    for entry in results["results"]:
+        old = previous.get(entry["products"])
+        if old is None:
+            continue
+        for mode in ("run", "endpoint"):
+            for metric in ("p50_ms", "p95_ms", "stores_per_s", "peak_rss_mb"):
+                before, after = old.get(mode, {}).get(metric), entry.get(mode, {}).get(metric)
+                if before and after is not None:
+                    print(f"{entry['products']:>8} {mode:<9} {metric:<13} {before:>10} -> {after:<10} {(after - before) / before:+.1%}")
+
+async def run_benchmarks(args) -> dict:
+    results = {"environment": environment(), "config": vars(args), "results": []}
+    for products in sorted(args.products):
+        fixture = FixtureStore(products=products, latency=args.latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=args.retry_after, products_json=not args.no_products_json)
+        with fixture:
+            entry = {"products": products}
+            for mode, bench in (("run", bench_run), ("endpoint", bench_endpoint)):
+                if mode in args.modes:
+                    entry[mode] = await bench(fixture, args)
+                    print(f"{products:>8} products  {mode:<9} {json.dumps(entry[mode])}")
+            entry["extractor_cpu_ms"] = extractor_cpu(fixture, args.repeat)
+            print(f"{products:>8} products  cpu       {json.dumps(entry['extractor_cpu_ms'])}")
+            entry["catalog_memory"] = catalog_memory(fixture)
+            print(f"{products:>8} products  memory    {json.dumps(entry['catalog_memory'])}")
+            entry["fixture"] = {"requests": fixture.requests, "errors_injected": fixture.errors_injected, "throttles_injected": fixture.throttles_injected}
+        results["results"].append(entry)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--scrapes", type=int, default=10, help="stores scraped per catalog size and mode")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", choices=("run", "endpoint"), default=["run", "endpoint"])
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fixture response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fixture responses that are 500s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of fixture responses that are 429s")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--no-products-json", action="store_true", help="serve /products.json as a 404 so catalogs come from the sitemap")
+    parser.add_argument("--repeat", type=int, default=20, help="calls per page extractor when timing CPU")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "bench_scraper.json"))
+    parser.add_argument("--compare", help="a previous --output file to diff against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmarks(args))
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
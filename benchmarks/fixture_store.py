@@ -0,0 +1,215 @@
+"""
+A local stand-in for Shopify storefronts, served in-process for benchmarks.
+
+Any number of synthetic stores live under one server at /stores/<n>; each has a
+homepage, contact, FAQ and policy pages, a paginated /products.json that honours
+`limit`, `page` and `since_id`, /products/<handle>.json for each product, and a
+/sitemap.xml index over sitemap_products_<n>.xml files. /products.json can be turned
+off to exercise sitemap discovery. Latency, 5xx errors and 429 throttling can be injected.
+
+    with FixtureStore(products=10000, latency=0.02, throttle_rate=0.05) as fixture:
+        insights = await ShopifyScraper(fixture.url(0)).run()
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+PRODUCTS_PAGE_MAX = 250
+# Products per sitemap_products_<n>.xml, as on Shopify.
+SITEMAP_PAGE_SIZE = 5000
+HERO_PRODUCTS = 8
+FAQ_ITEMS = 12
+# Links in the FAQ page's menu, standing in for the header and footer a theme wraps every page in.
+MENU_LINKS = 300
+
+_STORE_PATH = re.compile(r"^/stores/(\d+)(/.*)?$")
+_PRODUCT_PATH = re.compile(r"^/products/product-(\d+)\.json$")
+_SITEMAP_PATH = re.compile(r"^/sitemap_products_(\d+)\.xml$")
+
+class FixtureStore:
+    def __init__(self, products: int = 100, latency: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: float = 1.0, seed: int = 0, products_json: bool = True):
+        """
+        `latency` seconds are added to every response. A random `error_rate` fraction of
+        requests get a 500, and a `throttle_rate` fraction get a 429 with `retry_after`.
+        Without `products_json`, /products.json is a 404 as on stores that disable it.
+        """
+        self.products = products
+        self.products_json = products_json
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.requests = 0
+        self.errors_injected = 0
+        self.throttles_injected = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> "FixtureStore":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fixture = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FixtureStore":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def url(self, store_id: int) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/stores/{store_id}"
+
+    def _inject(self) -> Optional[int]:
+        """The status to fail the next request with, if any."""
+        with self._lock:
+            self.requests += 1
+            roll = self._rng.random()
+            if roll < self.error_rate:
+                self.errors_injected += 1
+                return 500
+            if roll < self.error_rate + self.throttle_rate:
+                self.throttles_injected += 1
+                return 429
+        return None
+
+    def product(self, i: int) -> dict:
+        product_id = 7_000_000_000_000 + i
+        return {
+            "id": product_id,
+            "title": f"Product {i}",
+            "handle": f"product-{i}",
+            "body_html": f"<p>Product {i} is made from organic cotton. Machine wash cold, tumble dry low.</p>",
+            "vendor": f"Vendor {i % 50}",
+            "product_type": ("Apparel", "Accessories", "Footwear")[i % 3],
+            "created_at": "2024-01-01T00:00:00+00:00",
+            "updated_at": f"2024-{1 + i % 12:02d}-01T00:00:00+00:00",
+            "tags": ["bench", f"tag-{i % 20}"],
+            "variants": [
+                {"id": product_id * 10 + v, "title": size, "price": f"{10 + i % 490}.{v}0", "available": (i + v) % 7 != 0, "sku": f"SKU-{i}-{v}"}
+                for v, size in enumerate(("S", "M", "L"))
+            ],
+        }
+
+    def products_page(self, query: dict) -> bytes:
+        limit = min(int(query.get("limit", ["30"])[0]), PRODUCTS_PAGE_MAX)
+        if "since_id" in query:
+            first = max(0, int(query["since_id"][0]) - 7_000_000_000_000 + 1)
+        else:
+            first = (int(query.get("page", ["1"])[0]) - 1) * limit
+        items = [self.product(i) for i in range(first, min(first + limit, self.products))]
+        return json.dumps({"products": items}).encode()
+
+    def sitemap_index(self, origin: str) -> bytes:
+        children = "".join(
+            f"<sitemap><loc>{origin}/sitemap_products_{n + 1}.xml?from={n * SITEMAP_PAGE_SIZE}&amp;to={(n + 1) * SITEMAP_PAGE_SIZE - 1}</loc></sitemap>"
+            for n in range(-(-self.products // SITEMAP_PAGE_SIZE))
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{children}</sitemapindex>'.encode()
+
+    def products_sitemap(self, origin: str, n: int) -> bytes:
+        first = (n - 1) * SITEMAP_PAGE_SIZE
+        urls = "".join(
+            f"<url><loc>{origin}/products/product-{i}</loc><lastmod>{self.product(i)['updated_at']}</lastmod><changefreq>daily</changefreq></url>"
+            for i in range(first, min(first + SITEMAP_PAGE_SIZE, self.products))
+        )
+        # Like Shopify's, the first entry is the storefront itself.
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"><url><loc>{origin}/</loc></url>{urls}</urlset>'.encode()
+
+    def homepage(self, prefix: str) -> bytes:
+        hero_links = "".join(f'<a href="{prefix}/products/product-{i}?variant=1">Product {i}</a>' for i in range(min(HERO_PRODUCTS, self.products)))
+        return f"""<!DOCTYPE html><html><head><title>Bench Store</title>
+<meta name="description" content="Bench Store makes everyday basics from organic cotton.">
+<script>Shopify.theme = {{"name":"Bench Dawn","id":1,"schema_name":"Dawn","schema_version":"15.0.0","theme_store_id":887,"role":"main"}};</script></head><body>
+<header><nav><a href="{prefix}/">Home</a><a href="{prefix}/collections/all">Shop</a><a href="{prefix}/pages/about-us">About us</a>
+<a href="{prefix}/pages/contact">Contact us</a><a href="{prefix}/pages/faq">FAQ</a></nav></header>
+<main id="MainContent"><section class="featured">{hero_links}</section></main>
+<footer><a href="{prefix}/policies/privacy-policy">Privacy policy</a><a href="{prefix}/policies/refund-policy">Refund policy</a>
+<a href="{prefix}/pages/shipping">Shipping</a><a href="{prefix}/pages/track-order">Track order</a>
+<a href="https://www.instagram.com/benchstore">Instagram</a><a href="https://www.facebook.com/benchstore">Facebook</a>
+<a href="https://twitter.com/benchstore">Twitter</a><a href="https://www.youtube.com/@benchstore">YouTube</a>
+<p>Write to hello@benchstore.com or call +1 555-010-2030.</p></footer></body></html>""".encode()
+
+    def contact_page(self) -> bytes:
+        return b"<html><body><h1>Contact</h1><p>support@benchstore.com, orders@benchstore.com</p><p>Phone: 555 010 9999</p></body></html>"
+
+    def faq_page(self) -> bytes:
+        items = "".join(
+            f'<details class="accordion__item"><summary>Question {i}?</summary><div class="accordion__content">Answer {i}.</div></details>'
+            for i in range(FAQ_ITEMS)
+        )
+        menu = "".join(f'<li class="menu__item"><a href="/collections/collection-{i}" class="menu__link">Collection {i}</a></li>' for i in range(MENU_LINKS))
+        return f"<html><body><header><nav><ul>{menu}</ul></nav></header><main><h1>FAQ</h1>{items}</main></body></html>".encode()
+
+    def page(self, path: str, query: Optional[dict] = None) -> Optional[bytes]:
+        """The body served for `path` (e.g. "/stores/0/pages/faq"), or None for a 404."""
+        match = _STORE_PATH.match(path)
+        if not match:
+            return None
+        prefix, rest = f"/stores/{match.group(1)}", match.group(2) or "/"
+        if rest == "/products.json":
+            return self.products_page(query or {}) if self.products_json else None
+        origin = f"http://127.0.0.1:{self._server.server_port}{prefix}"
+        if rest == "/sitemap.xml":
+            return self.sitemap_index(origin)
+        sitemap = _SITEMAP_PATH.match(rest)
+        if sitemap:
+            return self.products_sitemap(origin, int(sitemap.group(1)))
+        product = _PRODUCT_PATH.match(rest)
+        if product:
+            i = int(product.group(1))
+            return json.dumps({"product": self.product(i)}).encode() if i < self.products else None
+        if rest == "/":
+            return self.homepage(prefix)
+        if rest == "/pages/contact":
+            return self.contact_page()
+        if rest == "/pages/faq":
+            return self.faq_page()
+        if rest.startswith(("/pages/", "/policies/", "/collections/")):
+            return b"<html><body><p>Nothing to see here.</p></body></html>"
+        return None
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, every keep-alive
+    # response would wait out the client's delayed ACK (~40ms).
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "text/html", headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        fixture: FixtureStore = self.server.fixture
+        if fixture.latency:
+            time.sleep(fixture.latency)
+        injected = fixture._inject()
+        if injected == 429:
+            return self._send(429, headers={"Retry-After": str(fixture.retry_after)})
+        if injected:
+            return self._send(injected)
+        parts = urlsplit(self.path)
+        body = fixture.page(parts.path, parse_qs(parts.query))
+        if body is None:
+            return self._send(404)
+        content_type = "application/json" if parts.path.endswith(".json") else "application/xml" if parts.path.endswith(".xml") else "text/html"
+        self._send(200, body, content_type)
@@ -44,29 +44,242 @@
 #     db.refresh(db_brand)
 #     return db_brand
 
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.orm import Session
 from models import db_models, pydantic_models
+from scraper.crawl_state import CatalogRefresh, CrawlState, model_hash
 
-def create_brand_insights(db: Session, insights: pydantic_models.BrandInsights):
-    # Check if brand already exists
-    db_brand = db.query(db_models.Brand).filter(db_models.Brand.store_url == str(insights.store_url)).first()
+logger = logging.getLogger(__name__)
+
+# Products written per INSERT ... ON DUPLICATE KEY UPDATE batch; each batch is one transaction.
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "1000"))
+
+# Product columns overwritten on conflict.
+PRODUCT_SYNC_COLUMNS = ("title", "vendor", "product_type", "price", "brand_id", "content_hash")
+
+def _product_row(product: pydantic_models.Product, brand_id: int) -> dict:
+    return {
+        "shopify_product_id": product.id,
+        "title": product.title,
+        "vendor": product.vendor,
+        "product_type": product.product_type,
+        "price": product.price,
+        "brand_id": brand_id,
+    }
+
+def _upsert_products(db: Session, rows: List[dict], columns: Tuple[str, ...] = PRODUCT_SYNC_COLUMNS) -> None:
+    table = db_models.Product.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in columns})
+    elif dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["shopify_product_id"],
+            set_={column: stmt.excluded[column] for column in columns},
+        )
+    else:
+        raise ValueError(f"Bulk product upsert is not supported for the {dialect} dialect")
+    db.execute(stmt, rows)
+
+def get_or_create_brand(db: Session, store_url: str, brand_context: Optional[str] = None) -> db_models.Brand:
+    db_brand = db.query(db_models.Brand).filter(db_models.Brand.store_url == store_url).first()
     if not db_brand:
-        db_brand = db_models.Brand(store_url=str(insights.store_url), brand_context=insights.brand_context)
+        db_brand = db_models.Brand(store_url=store_url, brand_context=brand_context)
         db.add(db_brand)
         db.commit()
         db.refresh(db_brand)
-    
-    # Simple example for products
-    for product in insights.product_catalog:
-        db_product = db.query(db_models.Product).filter(db_models.Product.shopify_product_id == product.id).first()
-        if not db_product:
-            new_prod = db_models.Product(
-                shopify_product_id=product.id,
-                title=product.title,
-                vendor=product.vendor,
-                price=product.price,
-                brand_id=db_brand.id
-            )
-            db.add(new_prod)
+    return db_brand
+
+def create_brand_insights(db: Session, insights: pydantic_models.BrandInsights, hashes: Optional[Dict[int, int]] = None) -> db_models.Brand:
+    """
+    Saves a brand's context and its catalog and hero products. Products are written in
+    batched upserts; each batch first reads the stored content hashes of just its ids
+    and skips the products whose hash is unchanged. `hashes` are the products' content
+    hashes when the caller already has them (a refresh does); otherwise they are
+    computed from the models.
+    """
+    db_brand = get_or_create_brand(db, str(insights.store_url), insights.brand_context)
+    if insights.brand_context is not None and db_brand.brand_context != insights.brand_context:
+        db_brand.brand_context = insights.brand_context
+        db.commit()
+
+    # Hero products are usually in the catalog too; each id is written once.
+    products = {product.id: product for product in insights.hero_products}
+    products.update((product.id, product) for product in insights.product_catalog)
+    products = list(products.values())
+    written = 0
+    for start in range(0, len(products), PERSIST_BATCH_SIZE):
+        batch = products[start:start + PERSIST_BATCH_SIZE]
+        stored = dict(db.query(db_models.Product.shopify_product_id, db_models.Product.content_hash).filter(
+            db_models.Product.brand_id == db_brand.id,
+            db_models.Product.shopify_product_id.in_([product.id for product in batch]),
+        ))
+        rows = []
+        for product in batch:
+            content_hash = hashes[product.id] if hashes is not None else model_hash(product)
+            if stored.get(product.id) == content_hash:
+                continue
+            row = _product_row(product, db_brand.id)
+            row["content_hash"] = content_hash
+            rows.append(row)
+        try:
+            if rows:
+                _upsert_products(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        written += len(rows)
+    logger.info(f"Saved products for {insights.store_url}: {written} written, {len(products) - written} unchanged")
+    return db_brand
+
+def find_brand(db: Session, store_urls: List[str]) -> Optional[db_models.Brand]:
+    """The stored brand under any of `store_urls` (e.g. its https and http forms)."""
+    return db.query(db_models.Brand).filter(db_models.Brand.store_url.in_(store_urls)).first()
+
+def get_stored_brand(db: Session, db_brand: db_models.Brand) -> pydantic_models.StoredBrand:
+    product_count = db.query(db_models.Product.id).filter(db_models.Product.brand_id == db_brand.id).count()
+    return pydantic_models.StoredBrand(
+        store_url=db_brand.store_url,
+        brand_context=db_brand.brand_context,
+        product_count=product_count,
+        catalog_watermark=db_brand.catalog_watermark,
+    )
+
+def list_brand_products(
+    db: Session,
+    brand_id: int,
+    vendor: Optional[str] = None,
+    product_type: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    after: Optional[int] = None,
+    limit: int = 100,
+) -> pydantic_models.ProductPage:
+    """
+    One page of a brand's stored products in shopify_product_id order. Pagination is
+    keyset-based: `after` is the last id of the previous page, so every page is an
+    index range scan however deep into the catalog it is, unlike OFFSET.
+    """
+    Product = db_models.Product
+    query = db.query(Product.shopify_product_id, Product.title, Product.vendor, Product.product_type, Product.price).filter(Product.brand_id == brand_id)
+    if vendor is not None:
+        query = query.filter(Product.vendor == vendor)
+    if product_type is not None:
+        query = query.filter(Product.product_type == product_type)
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+    if after is not None:
+        query = query.filter(Product.shopify_product_id > after)
+    # One extra row tells us whether there is a next page.
+    rows = query.order_by(Product.shopify_product_id).limit(limit + 1).all()
+    products = [
+        pydantic_models.StoredProduct(id=row[0], title=row[1], vendor=row[2], product_type=row[3], price=row[4])
+        for row in rows[:limit]
+    ]
+    next_cursor = products[-1].id if len(rows) > limit else None
+    return pydantic_models.ProductPage(products=products, next_cursor=next_cursor)
+
+def _tracked_store(db_brand: db_models.Brand, default_interval: float) -> pydantic_models.TrackedStore:
+    return pydantic_models.TrackedStore(
+        store_url=db_brand.store_url,
+        recrawl_interval=db_brand.recrawl_interval or default_interval,
+        next_crawl_at=db_brand.next_crawl_at,
+        last_crawled_at=db_brand.last_crawled_at,
+        last_changed_at=db_brand.last_changed_at,
+        crawl_failures=db_brand.crawl_failures or 0,
+    )
+
+def track_brand(db: Session, store_url: str, interval: float, next_crawl_at: float) -> pydantic_models.TrackedStore:
+    """Adds a store to the re-crawl schedule; an already tracked store keeps its schedule."""
+    db_brand = get_or_create_brand(db, store_url)
+    if not db_brand.tracked:
+        db_brand.tracked = True
+        db_brand.recrawl_interval = db_brand.recrawl_interval or interval
+        db_brand.next_crawl_at = next_crawl_at
+        db_brand.crawl_failures = 0
+        db.commit()
+    return _tracked_store(db_brand, interval)
+
+def untrack_brand(db: Session, store_urls: List[str]) -> bool:
+    db_brand = find_brand(db, store_urls)
+    if not db_brand or not db_brand.tracked:
+        return False
+    db_brand.tracked = False
+    db_brand.next_crawl_at = None
+    db.commit()
+    return True
+
+def list_tracked_brands(db: Session, default_interval: float) -> List[pydantic_models.TrackedStore]:
+    brands = db.query(db_models.Brand).filter(db_models.Brand.tracked.is_(True)).order_by(db_models.Brand.next_crawl_at)
+    return [_tracked_store(db_brand, default_interval) for db_brand in brands]
+
+def due_brands(db: Session, now: float, limit: int, exclude_ids: List[int]) -> List[Tuple[int, str, Optional[float], int]]:
+    """(id, store_url, recrawl_interval, crawl_failures) of tracked brands due by `now`, most overdue first."""
+    Brand = db_models.Brand
+    query = db.query(Brand.id, Brand.store_url, Brand.recrawl_interval, Brand.crawl_failures).filter(
+        Brand.tracked.is_(True),
+        Brand.next_crawl_at <= now,
+    )
+    if exclude_ids:
+        query = query.filter(Brand.id.notin_(exclude_ids))
+    return [tuple(row) for row in query.order_by(Brand.next_crawl_at).limit(limit)]
+
+def next_due_at(db: Session, exclude_ids: List[int]) -> Optional[float]:
+    """When the earliest tracked brand not in `exclude_ids` falls due."""
+    query = db.query(func.min(db_models.Brand.next_crawl_at)).filter(db_models.Brand.tracked.is_(True))
+    if exclude_ids:
+        query = query.filter(db_models.Brand.id.notin_(exclude_ids))
+    return query.scalar()
+
+def update_recrawl_schedule(db: Session, brand_id: int, **schedule) -> None:
+    """Writes a finished re-crawl's schedule columns (recrawl_interval, next_crawl_at, ...)."""
+    db.query(db_models.Brand).filter(db_models.Brand.id == brand_id).update(schedule, synchronize_session=False)
     db.commit()
-    return db_brand
\ No newline at end of file
+
+def load_crawl_state(db: Session, store_url: str) -> CrawlState:
+    db_brand = db.query(db_models.Brand).filter(db_models.Brand.store_url == store_url).first()
+    if not db_brand:
+        return CrawlState()
+    hashes = db.query(db_models.Product.shopify_product_id, db_models.Product.content_hash).filter(
+        db_models.Product.brand_id == db_brand.id,
+        db_models.Product.content_hash.isnot(None),
+    )
+    return CrawlState(watermark=db_brand.catalog_watermark, hashes=dict(hashes))
+
+def apply_catalog_refresh(db: Session, store_url: str, refresh: CatalogRefresh) -> db_models.Brand:
+    """
+    Persists an incremental re-crawl: updates the brand context, upserts only the changed
+    products, deletes the ones that disappeared, and advances the brand's watermark
+    once the crawl was complete.
+    """
+    db_brand = create_brand_insights(
+        db,
+        pydantic_models.BrandInsights(store_url=store_url, brand_context=refresh.brand_context, product_catalog=refresh.changed),
+        refresh.hashes,
+    )
+
+    for start in range(0, len(refresh.deleted_ids), PERSIST_BATCH_SIZE):
+        try:
+            db.query(db_models.Product).filter(
+                db_models.Product.brand_id == db_brand.id,
+                db_models.Product.shopify_product_id.in_(refresh.deleted_ids[start:start + PERSIST_BATCH_SIZE]),
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    if refresh.complete and refresh.watermark != db_brand.catalog_watermark:
+        db_brand.catalog_watermark = refresh.watermark
+        db.commit()
+    logger.info(f"Refreshed catalog for {store_url}: {len(refresh.changed)} changed, {len(refresh.deleted_ids)} deleted, {refresh.unchanged} unchanged")
+    return db_brand
@@ -0,0 +1,150 @@
+"""
+Versioned schema upgrades for databases created by an older release.
+
+Base.metadata.create_all only creates missing tables; it never adds a column, widens
+a type or builds an index on a table that already exists. Each migration below does
+that for one release, and the version reached is kept in the schema_version table.
+Every step checks the live schema first, so columns or indexes already added by hand
+(as earlier READMEs told you to) are skipped. Run pending migrations with:
+
+    python -m database.migrations
+    python -m database.migrations --database-url mysql+pymysql://user:pw@host/db
+
+A new database gets the current schema from create_all and is stamped with the latest
+version at startup (see prepare_schema), so it never runs these.
+"""
+import argparse
+import logging
+import sys
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateIndex
+from database.database import engine as default_engine
+from models import db_models
+
+logger = logging.getLogger(__name__)
+
+_metadata = MetaData()
+schema_version = Table("schema_version", _metadata, Column("version", Integer, nullable=False))
+
+def _add_columns(table: str, *columns: Tuple[str, str]) -> Callable[[Connection], None]:
+    """ALTER TABLE ... ADD COLUMN for each (name, DDL) the table doesn't have yet."""
+    def step(connection: Connection) -> None:
+        existing = {column["name"] for column in inspect(connection).get_columns(table)}
+        for name, ddl in columns:
+            if name not in existing:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+    return step
+
+def _create_indexes(table: str, *names: str) -> Callable[[Connection], None]:
+    """Creates the named indexes of a db_models table, as declared there, unless they exist."""
+    def step(connection: Connection) -> None:
+        existing = {index["name"] for index in inspect(connection).get_indexes(table)}
+        for index in db_models.Base.metadata.tables[table].indexes:
+            if index.name in names and index.name not in existing:
+                connection.execute(CreateIndex(index))
+    return step
+
+def _widen_product_ids(connection: Connection) -> None:
+    # SQLite's INTEGER is already 64-bit.
+    column = next(column for column in inspect(connection).get_columns("products") if column["name"] == "shopify_product_id")
+    if "BIGINT" in str(column["type"]).upper():
+        return
+    if connection.dialect.name == "mysql":
+        connection.execute(text("ALTER TABLE products MODIFY shopify_product_id BIGINT"))
+    elif connection.dialect.name == "postgresql":
+        connection.execute(text("ALTER TABLE products ALTER COLUMN shopify_product_id TYPE BIGINT"))
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    steps: Tuple[Callable[[Connection], None], ...]
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "products.shopify_product_id to BIGINT", (_widen_product_ids,)),
+    Migration(2, "catalog watermark and product content hashes for incremental re-crawls", (
+        _add_columns("brands", ("catalog_watermark", "VARCHAR(40)")),
+        _add_columns("products", ("content_hash", "BIGINT")),
+    )),
+    Migration(3, "products.product_type and the product listing indexes", (
+        _add_columns("products", ("product_type", "VARCHAR(255)")),
+        _create_indexes("products", "ix_products_brand_product", "ix_products_brand_vendor", "ix_products_brand_type", "ix_products_brand_price"),
+    )),
+    Migration(4, "re-crawl schedule of tracked stores", (
+        _add_columns(
+            "brands",
+            ("tracked", "BOOLEAN NOT NULL DEFAULT FALSE"),
+            ("recrawl_interval", "FLOAT"),
+            ("next_crawl_at", "FLOAT"),
+            ("last_crawled_at", "FLOAT"),
+            ("last_changed_at", "FLOAT"),
+            ("crawl_failures", "INTEGER NOT NULL DEFAULT 0"),
+        ),
+        _create_indexes("brands", "ix_brands_tracked_next_crawl"),
+    )),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def current_version(connection: Connection) -> int:
+    """The schema version reached; 0 for a database from before versioning."""
+    if not inspect(connection).has_table("schema_version"):
+        return 0
+    return connection.execute(select(schema_version.c.version)).scalar() or 0
+
+def _set_version(connection: Connection, version: int) -> None:
+    _metadata.create_all(bind=connection)
+    connection.execute(schema_version.delete())
+    connection.execute(schema_version.insert().values(version=version))
+
+def prepare_schema(bind: Engine = default_engine) -> List[Migration]:
+    """
+    Creates missing tables at startup and returns the migrations the database still
+    needs. A database without the brands table is new: create_all gives it the
+    current schema, so it is stamped with the latest version.
+    """
+    with bind.begin() as connection:
+        new = not inspect(connection).has_table("brands")
+        db_models.Base.metadata.create_all(bind=connection)
+        if new:
+            _set_version(connection, LATEST_VERSION)
+            return []
+        version = current_version(connection)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+def upgrade(bind: Engine = default_engine) -> List[Migration]:
+    """Applies every pending migration in order, each in its own transaction. Returns those applied."""
+    with bind.begin() as connection:
+        db_models.Base.metadata.create_all(bind=connection)
+        version = current_version(connection)
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        # MySQL commits DDL implicitly, but the steps are safe to re-run if a later one fails.
+        with bind.begin() as connection:
+            for step in migration.steps:
+                step(connection)
+            _set_version(connection, migration.version)
+        logger.info(f"Applied schema migration {migration.version}: {migration.description}")
+        applied.append(migration)
+    return applied
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    bind = create_engine(args.database_url) if args.database_url else default_engine
+    try:
+        applied = upgrade(bind)
+    except SQLAlchemyError as e:
+        sys.exit(f"Migration failed: {e}")
+    print(f"Schema is at version {LATEST_VERSION}; applied {len(applied)} migration(s).", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
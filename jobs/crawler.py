@@ -0,0 +1,208 @@
+"""
+Offline bulk crawler: scrapes a list of store URLs into a JSONL file, without the API.
+
+    python -m jobs.crawler stores.txt --output crawl.jsonl
+    cat stores.txt | python -m jobs.crawler - --output crawl.jsonl --workers 8 --concurrency 64
+
+URLs are read one per line (blank lines and # comments are skipped, a missing scheme
+means https) and sharded by host across worker processes. Each worker scrapes its shard
+through a BatchRunner on its own HTTP client, so every process keeps its own warm
+connections and a host is only ever crawled, and rate limited, by one of them. Each
+result is one BatchScrapeResult line, {"website_url", "ok", "insights", "error"}.
+
+The output doubles as the checkpoint. Stores already in it are skipped when the same
+command is run again, so an interrupted crawl resumes where it stopped. With
+--retry-failed, stores that failed are scraped again; their new line is appended after
+the old one, so the last line for a store wins. Throughput, error rate and ETA are
+printed to stderr as the crawl runs.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import sys
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Worker processes, and stores each of them scrapes at once.
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", str(os.cpu_count() or 1)))
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "64"))
+
+# BatchScrapeResult serializes website_url and ok first, so resuming reads just this much of each line.
+_RESULT_PREFIX = re.compile(r'\{"website_url":("(?:[^"\\]|\\.)*"),"ok":(true|false)')
+
+def read_urls(lines: Iterable[str]) -> List[str]:
+    """Store URLs in input order, normalized and without duplicates; invalid lines are logged and skipped."""
+    from scraper.scraper import normalize_store_url
+    urls = {}
+    for line in lines:
+        url = line.strip()
+        if not url or url.startswith('#'):
+            continue
+        if "://" not in url:
+            url = f"https://{url}"
+        try:
+            urls[normalize_store_url(url)] = None
+        except ValueError:
+            logger.warning(f"Skipping invalid store URL: {line.strip()}")
+    return list(urls)
+
+def read_checkpoint(path: str, retry_failed: bool) -> Set[str]:
+    """
+    The normalized URLs already in the output file. A last line cut short by an
+    interrupted crawl is truncated away so new results start on a line of their own.
+    """
+    from scraper.scraper import normalize_store_url
+    done: Dict[str, bool] = {}
+    try:
+        with open(path, "rb+") as f:
+            end = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                end += len(line)
+                match = _RESULT_PREFIX.match(line.decode(errors="replace"))
+                if match:
+                    done[normalize_store_url(json.loads(match.group(1)))] = match.group(2) == "true"
+            f.truncate(end)
+    except FileNotFoundError:
+        pass
+    return {url for url, ok in done.items() if ok or not retry_failed}
+
+def shard(urls: List[str], workers: int) -> List[List[str]]:
+    """Splits `urls` by host, so each host's stores all go to the same worker."""
+    shards = [[] for _ in range(workers)]
+    for url in urls:
+        shards[zlib.crc32(urlsplit(url).netloc.lower().encode()) % workers].append(url)
+    return [part for part in shards if part]
+
+def _crawl_shard(urls: List[str], fields: Optional[List[str]], concurrency: int, timeout: Optional[float], results: multiprocessing.Queue) -> None:
+    """Worker process entry point: puts an (ok, JSON line) pair per store, then None."""
+    logging.basicConfig(level=logging.ERROR)
+    try:
+        asyncio.run(_scrape_shard(urls, fields, concurrency, timeout, results))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        results.put(None)
+
+async def _scrape_shard(urls: List[str], fields: Optional[List[str]], concurrency: int, timeout: Optional[float], results: multiprocessing.Queue) -> None:
+    from models.pydantic_models import ScrapeRequest
+    from scraper.batch import BatchRunner
+    from scraper.http_client import create_http_client
+    from scraper.themes import ExtractionPlans
+    options = {"extraction_plans": ExtractionPlans()}
+    if timeout is not None:
+        options["timeout"] = timeout
+    runner = BatchRunner(concurrency=concurrency)
+    async with create_http_client() as client:
+        stores = [ScrapeRequest(website_url=url, fields=fields) for url in urls]
+        async for result in runner.run(stores, client=client, **options):
+            # Serialized here, so the parent only has to write lines.
+            results.put((result.ok, result.model_dump_json()))
+
+class CrawlProgress:
+    def __init__(self, total: int, skipped: int):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        eta = f"{int(remaining / rate) // 60}m{int(remaining / rate) % 60:02d}s" if rate > 0 else "-"
+        error_rate = self.errors / self.done if self.done else 0.0
+        return f"{self.done}/{self.total} stores ({self.skipped} already done)  {rate:.1f} stores/s  errors {error_rate:.1%}  ETA {eta}"
+
+def crawl(urls: List[str], output: str, workers: int = CRAWL_WORKERS, concurrency: int = CRAWL_CONCURRENCY, fields: Optional[List[str]] = None, timeout: Optional[float] = None, retry_failed: bool = False) -> Tuple[int, int]:
+    """Scrapes every URL not already in `output`, appending results to it. Returns (done, errors)."""
+    done_urls = read_checkpoint(output, retry_failed)
+    pending = [url for url in urls if url not in done_urls]
+    progress = CrawlProgress(total=len(pending), skipped=len(urls) - len(pending))
+    shards = shard(pending, max(1, workers))
+    # "spawn" so workers start clean, as the parse pool's do.
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=_crawl_shard, args=(part, fields, concurrency, timeout, results), daemon=True)
+        for part in shards
+    ]
+    for process in processes:
+        process.start()
+
+    running = len(processes)
+    last_report = 0.0
+    with open(output, "a", encoding="utf-8") as out:
+        try:
+            while running:
+                try:
+                    result = results.get(timeout=1)
+                except queue.Empty:
+                    # A worker killed outright never sends its None.
+                    running = min(running, sum(process.is_alive() for process in processes))
+                    result = ()
+                if result is None:
+                    running -= 1
+                elif result:
+                    ok, line = result
+                    out.write(line + "\n")
+                    progress.done += 1
+                    progress.errors += not ok
+                now = time.perf_counter()
+                if now - last_report >= 1:
+                    last_report = now
+                    # Everything written so far survives an interruption.
+                    out.flush()
+                    print(f"\r{progress.line()}", end="", file=sys.stderr, flush=True)
+        except KeyboardInterrupt:
+            print("\nInterrupted; run the same command again to resume.", file=sys.stderr)
+            raise
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+    print(f"\r{progress.line()}", file=sys.stderr)
+    return progress.done, progress.errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", help="file with one store URL per line, or - for stdin")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to; also the resume checkpoint")
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS, help="worker processes")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY, help="stores scraped at once per worker")
+    parser.add_argument("--fields", nargs="+", help="only these BrandInsights sections (all by default)")
+    parser.add_argument("--timeout", type=float, help="per-store scrape timeout in seconds (default SCRAPE_TIMEOUT)")
+    parser.add_argument("--retry-failed", action="store_true", help="scrape stores whose earlier result was an error again")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    from scraper.scraper import SECTION_SOURCES
+    unknown = set(args.fields or ()) - SECTION_SOURCES.keys()
+    if unknown:
+        parser.error(f"unknown fields: {', '.join(sorted(unknown))}")
+    if args.urls == "-":
+        urls = read_urls(sys.stdin)
+    else:
+        with open(args.urls) as f:
+            urls = read_urls(f)
+    try:
+        done, errors = crawl(urls, args.output, args.workers, args.concurrency, args.fields, args.timeout, args.retry_failed)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(f"{done} stores scraped, {errors} failed; results in {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
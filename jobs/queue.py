@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from fastapi import Request
+from models.pydantic_models import BrandInsights, JobStatus
+from scraper.coalesce import SingleFlight
+from scraper.scraper import ScrapeProgress, ShopifyScraper
+
+logger = logging.getLogger(__name__)
+
+# Scrapes the queue runs at once.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Jobs waiting to start; submissions beyond this are rejected.
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "1000"))
+# Seconds a finished job and its result stay available.
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+
+class QueueFullError(Exception):
+    pass
+
+@dataclass
+class Job:
+    website_url: str
+    fields: Optional[List[str]] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: ScrapeProgress = field(default_factory=ScrapeProgress)
+    result: Optional[BrandInsights] = None
+    error: Optional[str] = None
+    # HTTP status the synchronous endpoint would have answered with for this failure
+    error_status_code: Optional[int] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_status(self) -> JobStatus:
+        return JobStatus(
+            job_id=self.id,
+            website_url=self.website_url,
+            status=self.status,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            pages_fetched=self.progress.pages_fetched,
+            products_parsed=self.progress.products_parsed,
+            error=self.error,
+        )
+
+class JobQueue:
+    """
+    In-process scrape queue drained by a fixed pool of asyncio worker tasks.
+    Scrapes go through `flights`, so jobs for a store already being scraped join that scrape.
+    """
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_SIZE, result_ttl: float = JOB_RESULT_TTL, flights: Optional[SingleFlight] = None):
+        self.flights = flights or SingleFlight()
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.jobs: Dict[str, Job] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._tasks: List[asyncio.Task] = []
+        self._scraper_options: dict = {}
+
+    def start(self, **scraper_options) -> None:
+        """Starts the workers; `scraper_options` are passed to every ShopifyScraper."""
+        self._scraper_options = scraper_options
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, website_url: str, fields: Optional[List[str]] = None) -> Job:
+        self._prune()
+        job = Job(website_url=website_url, fields=fields)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"The job queue is full ({self._queue.maxsize} jobs waiting).")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _prune(self) -> None:
+        expired_before = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < expired_before]:
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        flight = self.flights.join(ShopifyScraper(job.website_url, fields=job.fields, **self._scraper_options))
+        # Share the live counters of the scrape we ended up on so status polls see progress mid-scrape.
+        job.progress = flight.scraper.progress
+        try:
+            job.result = await flight.wait()
+            job.status = "succeeded"
+        except asyncio.TimeoutError:
+            job.status, job.error_status_code, job.error = "failed", 504, "Timed out while scraping the website."
+        except ValueError as e:
+            job.status, job.error_status_code, job.error = "failed", 404, f"Website not found or failed to process: {e}"
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed for {job.website_url}")
+            job.status, job.error_status_code, job.error = "failed", 500, f"An internal server error occurred: {e}"
+        finally:
+            job.finished_at = time.time()
+
+# FastAPI dependency for the application-lifetime queue started at startup
+def get_job_queue(request: Request) -> JobQueue:
+    return request.app.state.job_queue
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Callable, Dict, Optional
+from fastapi import Request
+from sqlalchemy.exc import SQLAlchemyError
+from crud import operations
+from database.database import SessionLocal
+from models.pydantic_models import SchedulerStats
+from scraper.scraper import ShopifyScraper
+
+logger = logging.getLogger(__name__)
+
+# Re-crawls start outbound traffic on their own, so they only run where this is set to true.
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes")
+# Re-crawls running at once, and the most crawls started per second.
+RECRAWL_CONCURRENCY = int(os.getenv("RECRAWL_CONCURRENCY", "4"))
+RECRAWL_STARTS_PER_SECOND = float(os.getenv("RECRAWL_STARTS_PER_SECOND", "1"))
+# Upstream requests per second across every re-crawl, retries included (0 disables).
+RECRAWL_REQUESTS_PER_SECOND = float(os.getenv("RECRAWL_REQUESTS_PER_SECOND", "20"))
+# Bounds, in seconds, of a store's adaptive re-crawl interval, and where a new store starts.
+RECRAWL_MIN_INTERVAL = float(os.getenv("RECRAWL_MIN_INTERVAL", "900"))
+RECRAWL_MAX_INTERVAL = float(os.getenv("RECRAWL_MAX_INTERVAL", str(7 * 86400)))
+RECRAWL_INITIAL_INTERVAL = float(os.getenv("RECRAWL_INITIAL_INTERVAL", "3600"))
+# Longest the scheduler sleeps before looking for due stores again.
+SCHEDULER_POLL_INTERVAL = float(os.getenv("SCHEDULER_POLL_INTERVAL", "30"))
+
+def next_interval(interval: float, changed: bool, min_interval: float = RECRAWL_MIN_INTERVAL, max_interval: float = RECRAWL_MAX_INTERVAL) -> float:
+    """
+    Halves the interval when a crawl found changes and grows it by half when it
+    didn't, so each store settles near the rate its catalog actually changes at.
+    """
+    interval = interval / 2 if changed else interval * 1.5
+    return min(max_interval, max(min_interval, interval))
+
+def failure_delay(interval: float, failures: int, max_interval: float = RECRAWL_MAX_INTERVAL) -> float:
+    """Exponential backoff after `failures` consecutive failed crawls."""
+    return min(max_interval, interval * 2 ** min(failures, 32))
+
+def jittered(delay: float) -> float:
+    """Spreads stores that fall due together over +-10% of their delay."""
+    return delay * random.uniform(0.9, 1.1)
+
+class RecrawlScheduler:
+    """
+    Keeps tracked brands fresh by re-crawling them incrementally (ShopifyScraper.refresh)
+    as they fall due. Each brand's interval adapts to how often its catalog changes
+    (see next_interval), with exponential backoff while crawls keep failing. At most
+    `concurrency` crawls run at once and starts are spaced `1 / starts_per_second`
+    apart; the schedule lives in the brands table, so it survives restarts.
+    """
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        concurrency: int = RECRAWL_CONCURRENCY,
+        starts_per_second: float = RECRAWL_STARTS_PER_SECOND,
+        initial_interval: float = RECRAWL_INITIAL_INTERVAL,
+        poll_interval: float = SCHEDULER_POLL_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.concurrency = max(1, concurrency)
+        self.start_spacing = 1 / starts_per_second if starts_per_second > 0 else 0.0
+        self.initial_interval = initial_interval
+        self.poll_interval = poll_interval
+        self.crawls = 0
+        self.crawls_with_changes = 0
+        self.failures = 0
+        self.pages_fetched = 0
+        self.products_changed = 0
+        self._running: Dict[int, asyncio.Task] = {}
+        self._next_start = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._scraper_options: dict = {}
+
+    def start(self, **scraper_options) -> None:
+        """Starts scheduling; `scraper_options` are passed to every ShopifyScraper."""
+        self._scraper_options = scraper_options
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        tasks = [self._task, *self._running.values()] if self._task else list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._running.clear()
+
+    def wake(self) -> None:
+        """Looks for due stores right away, e.g. after a store was tracked."""
+        self._wakeup.set()
+
+    def _db(self, func, *args, **kwargs):
+        db = self.session_factory()
+        try:
+            return func(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    async def _loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            sleep = self.poll_interval
+            try:
+                free = self.concurrency - len(self._running)
+                if free > 0:
+                    due = await asyncio.to_thread(self._db, operations.due_brands, time.time(), free, list(self._running))
+                    for brand_id, store_url, interval, failures in due:
+                        await self._pace()
+                        task = asyncio.create_task(self._crawl(brand_id, store_url, interval or self.initial_interval, failures or 0))
+                        self._running[brand_id] = task
+                        task.add_done_callback(lambda task, brand_id=brand_id: self._finished(brand_id))
+                next_due = await asyncio.to_thread(self._db, operations.next_due_at, list(self._running))
+                if next_due is not None:
+                    sleep = min(sleep, max(0.0, next_due - time.time()))
+            except SQLAlchemyError as e:
+                logger.warning(f"Re-crawl scheduler could not read the schedule: {e}")
+            if len(self._running) >= self.concurrency:
+                # Nothing can start until a crawl finishes, which wakes us.
+                sleep = self.poll_interval
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), sleep)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _pace(self) -> None:
+        """Spaces crawl starts out so a backlog of due stores doesn't start as one burst."""
+        now = time.monotonic()
+        start_at = max(now, self._next_start)
+        self._next_start = start_at + self.start_spacing
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    def _finished(self, brand_id: int) -> None:
+        self._running.pop(brand_id, None)
+        self._wakeup.set()
+
+    async def _crawl(self, brand_id: int, store_url: str, interval: float, failures: int) -> None:
+        started = time.time()
+        scraper = ShopifyScraper(store_url, **self._scraper_options)
+        try:
+            state = await asyncio.to_thread(self._db, operations.load_crawl_state, store_url)
+            refresh = await scraper.refresh(state)
+            await asyncio.to_thread(self._db, operations.apply_catalog_refresh, store_url, refresh)
+            if not refresh.complete:
+                raise ValueError("the catalog could only be read partially")
+        except Exception as e:
+            self.failures += 1
+            failures += 1
+            logger.warning(f"Re-crawl of {store_url} failed ({failures} in a row): {e!r}")
+            schedule = {"crawl_failures": failures, "next_crawl_at": started + jittered(failure_delay(interval, failures))}
+        else:
+            changes = len(refresh.changed) + len(refresh.deleted_ids)
+            self.crawls_with_changes += bool(changes)
+            self.products_changed += changes
+            interval = next_interval(interval, bool(changes))
+            schedule = {"recrawl_interval": interval, "crawl_failures": 0, "next_crawl_at": started + jittered(interval)}
+            if changes:
+                schedule["last_changed_at"] = started
+        self.crawls += 1
+        self.pages_fetched += scraper.progress.pages_fetched
+        schedule["last_crawled_at"] = started
+        try:
+            await asyncio.to_thread(self._db, operations.update_recrawl_schedule, brand_id, **schedule)
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not save the re-crawl schedule of {store_url}: {e}")
+
+    def stats(self) -> SchedulerStats:
+        return SchedulerStats(
+            running=len(self._running),
+            crawls=self.crawls,
+            crawls_with_changes=self.crawls_with_changes,
+            failures=self.failures,
+            pages_fetched=self.pages_fetched,
+            products_changed=self.products_changed,
+        )
+
+# FastAPI dependency for the application-lifetime scheduler started at startup
+def get_scheduler(request: Request) -> RecrawlScheduler:
+    return request.app.state.scheduler
@@ -54,29 +54,141 @@
 # def read_root():
 #     return {"message": "Welcome to the Shopify Insights Fetcher API!"}
 
-from fastapi import FastAPI, HTTPException, Body
-from scraper.scraper import ShopifyScraper
-from models.pydantic_models import BrandInsights, ScrapeRequest
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Body, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from crud import operations
+from crud.export import EXPORT_MEDIA_TYPES, EXPORT_TABLES, export_filename, iter_export
+from database.database import engine, get_db
+from database.migrations import prepare_schema
+from models import db_models
+from scraper.scraper import ShopifyScraper, normalize_store_url
+from scraper.batch import BatchRunner
+from scraper.coalesce import SingleFlight
+from scraper.cache import ResponseCache, create_response_cache, get_response_cache
+from scraper.http_client import create_http_client, get_http_client
+from scraper.metrics import METRICS_ENABLED, REGISTRY, REQUEST_DURATION, PhaseTimings, get_server_timing
+from scraper.parse_pool import create_parse_pool, get_parse_pool
+from scraper.price_history import PriceHistory, create_price_history, get_price_history
+from scraper.themes import ExtractionPlans, create_extraction_plans, get_extraction_plans
+from jobs.queue import JobQueue, QueueFullError, get_job_queue
+from jobs.scheduler import RECRAWL_INITIAL_INTERVAL, RECRAWL_REQUESTS_PER_SECOND, SCHEDULER_ENABLED, RecrawlScheduler, get_scheduler
+from models.pydantic_models import BatchScrapeRequest, BrandInsights, CatalogRefreshSummary, CoalescingStats, ExtractionPlanStats, JobStatus, PriceChanges, ProductPage, SchedulerStats, ScrapeRequest, StoredBrand, TrackStoreRequest, TrackedStore
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import List, Optional
+import asyncio
+import httpx
+import itertools
+import json
 import logging
+import time
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the brands/products tables; scraping still works if the database is down
+    try:
+        pending = await run_in_threadpool(prepare_schema, engine)
+        if pending:
+            logger.warning(f"Database schema is {len(pending)} migration(s) behind; run python -m database.migrations")
+    except SQLAlchemyError as e:
+        logger.warning(f"Database unavailable, persistence endpoints will fail: {e}")
+    # One pooled client for the whole app, so repeat scrapes reuse warm connections
+    app.state.http_client = create_http_client()
+    app.state.response_cache = create_response_cache()
+    app.state.parse_pool = create_parse_pool()
+    app.state.price_history = create_price_history()
+    app.state.extraction_plans = create_extraction_plans()
+    app.state.job_queue = JobQueue(flights=scrape_flights)
+    app.state.job_queue.start(
+        client=app.state.http_client,
+        cache=app.state.response_cache,
+        parse_pool=app.state.parse_pool,
+        price_history=app.state.price_history,
+        extraction_plans=app.state.extraction_plans,
+    )
+    # Re-crawls of tracked stores get their own client, whose total request rate is capped
+    app.state.scheduler = RecrawlScheduler() if SCHEDULER_ENABLED else None
+    if app.state.scheduler is not None:
+        app.state.scheduler_client = create_http_client(requests_per_second=RECRAWL_REQUESTS_PER_SECOND)
+        app.state.scheduler.start(
+            client=app.state.scheduler_client,
+            cache=app.state.response_cache,
+            parse_pool=app.state.parse_pool,
+        )
+    try:
+        yield
+    finally:
+        if app.state.scheduler is not None:
+            await app.state.scheduler.stop()
+            await app.state.scheduler_client.aclose()
+        await app.state.job_queue.stop()
+        await app.state.http_client.aclose()
+        if app.state.parse_pool is not None:
+            app.state.parse_pool.shutdown(cancel_futures=True)
 
 app = FastAPI(
     title="Shopify Store Insights Fetcher",
     description="An API to fetch and structure data from Shopify stores.",
+    lifespan=lifespan,
 )
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Times every request for /metrics and adds a Server-Timing header where an endpoint recorded phases."""
+    if not METRICS_ENABLED:
+        return await call_next(request)
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    REQUEST_DURATION.observe(elapsed, route=route.path if route else "unmatched", method=request.method, status=response.status_code)
+    timings = getattr(request.state, "server_timing", None)
+    if timings is not None:
+        response.headers["Server-Timing"] = timings.server_timing(elapsed)
+    return response
+
+# Shared by every scrape path so concurrent scrapes of one store are coalesced process-wide.
+scrape_flights = SingleFlight()
+# Shared by every batch request so the concurrency limits apply process-wide.
+batch_runner = BatchRunner(flights=scrape_flights)
+
+# The app-lifetime resources every ShopifyScraper is built with
+def scraper_options(
+    client: httpx.AsyncClient = Depends(get_http_client),
+    cache: ResponseCache = Depends(get_response_cache),
+    parse_pool: Optional[Executor] = Depends(get_parse_pool),
+    price_history: Optional[PriceHistory] = Depends(get_price_history),
+    extraction_plans: Optional[ExtractionPlans] = Depends(get_extraction_plans)
+) -> dict:
+    return {"client": client, "cache": cache, "parse_pool": parse_pool, "price_history": price_history, "extraction_plans": extraction_plans}
+
 @app.post("/fetch-insights/", response_model=BrandInsights)
-async def fetch_store_insights(request: ScrapeRequest):
+async def fetch_store_insights(
+    request: ScrapeRequest,
+    options: dict = Depends(scraper_options),
+    timings: PhaseTimings = Depends(get_server_timing)
+):
     """
     Accepts a Shopify store URL and returns a structured JSON of brand insights.
     """
     logger.info(f"Received request for URL: {request.website_url}")
     try:
-        scraper = ShopifyScraper(str(request.website_url))
-        insights = scraper.run()
+        scraper = ShopifyScraper(str(request.website_url), fields=request.fields, **options)
+        # Concurrent requests for the same store share a single scrape.
+        flight = scrape_flights.join(scraper)
+        insights = await flight.wait()
+        timings.merge(flight.scraper.timings)
         return insights
+    except asyncio.TimeoutError:
+        logger.error(f"Scrape timed out for {request.website_url}")
+        raise HTTPException(status_code=504, detail="Timed out while scraping the website.")
     except ValueError as e:
         logger.error(f"Validation error for {request.website_url}: {e}")
         # Using 404 to indicate the resource (website) might not be accessible or valid
@@ -86,6 +198,303 @@ async def fetch_store_insights(request: ScrapeRequest):
         # Generic catch-all for other unexpected errors
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
+@app.post("/fetch-insights/stream")
+async def stream_store_insights(
+    request: ScrapeRequest,
+    options: dict = Depends(scraper_options)
+):
+    """
+    Streams the brand insights as NDJSON, one record per line, so large catalogs
+    never have to be held in memory. Each line is {"type": ..., "data": ...}.
+    """
+    logger.info(f"Received stream request for URL: {request.website_url}")
+    records = ShopifyScraper(str(request.website_url), fields=request.fields, **options).stream()
+    started = False
+    try:
+        # Pull the first record before responding so an unreachable homepage is still a 404.
+        first_record = await records.__anext__()
+        started = True
+    except ValueError as e:
+        logger.error(f"Validation error for {request.website_url}: {e}")
+        raise HTTPException(status_code=404, detail=f"Website not found or failed to process: {e}")
+    except Exception as e:
+        logger.exception(f"An internal error occurred for {request.website_url}")
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
+    finally:
+        # Without a response, ndjson_lines() never runs to tear the scrape and its HTTP streams down.
+        if not started:
+            await records.aclose()
+
+    async def ndjson_lines():
+        try:
+            yield json.dumps(first_record) + "\n"
+            async for record in records:
+                yield json.dumps(record) + "\n"
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band.
+            logger.exception(f"Stream failed for {request.website_url}")
+            yield json.dumps({"type": "error", "data": {"detail": str(e)}}) + "\n"
+        finally:
+            await records.aclose()
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+@app.post("/fetch-insights/batch")
+async def fetch_batch_insights(
+    request: BatchScrapeRequest,
+    options: dict = Depends(scraper_options)
+):
+    """
+    Scrapes many stores at once and streams one BatchScrapeResult per store as NDJSON,
+    in the order they finish. Failures are reported per store instead of failing the batch.
+    """
+    logger.info(f"Received batch request for {len(request.stores)} stores")
+
+    async def ndjson_lines():
+        results = batch_runner.run(request.stores, **options)
+        try:
+            async for result in results:
+                yield result.model_dump_json() + "\n"
+        finally:
+            await results.aclose()
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+@app.post("/fetch-insights/refresh", response_model=CatalogRefreshSummary)
+async def refresh_store_catalog(
+    request: ScrapeRequest,
+    options: dict = Depends(scraper_options),
+    db: Session = Depends(get_db),
+    timings: PhaseTimings = Depends(get_server_timing)
+):
+    """
+    Incrementally re-crawls a store's catalog against what the database already holds,
+    persisting only new, changed and deleted products.
+    """
+    store_url = normalize_store_url(str(request.website_url))
+    logger.info(f"Received refresh request for URL: {store_url}")
+    try:
+        with timings.phase("db"):
+            state = await run_in_threadpool(operations.load_crawl_state, db, store_url)
+        scraper = ShopifyScraper(store_url, **options)
+        refresh = await scraper.refresh(state)
+        timings.merge(scraper.timings)
+        with timings.phase("db"):
+            await run_in_threadpool(operations.apply_catalog_refresh, db, store_url, refresh)
+    except asyncio.TimeoutError:
+        logger.error(f"Refresh timed out for {store_url}")
+        raise HTTPException(status_code=504, detail="Timed out while scraping the website.")
+    except Exception as e:
+        logger.exception(f"An internal error occurred for {store_url}")
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
+    return CatalogRefreshSummary(
+        store_url=store_url,
+        changed=len(refresh.changed),
+        deleted=len(refresh.deleted_ids),
+        unchanged=refresh.unchanged,
+        complete=refresh.complete,
+    )
+
+def store_url_candidates(store: str) -> List[str]:
+    """The normalized URLs a store given by its domain (e.g. www.memy.co.in) may be kept under."""
+    try:
+        return [normalize_store_url(f"{scheme}://{store}") for scheme in ("https", "http")]
+    except ValueError:
+        return []
+
+def stored_brand(store: str, db: Session) -> db_models.Brand:
+    """The persisted brand for a store given by its domain, stored under https or http."""
+    store_urls = store_url_candidates(store)
+    db_brand = operations.find_brand(db, store_urls) if store_urls else None
+    if not db_brand:
+        raise HTTPException(status_code=404, detail="Brand not found.")
+    return db_brand
+
+@app.get("/brands/{store}", response_model=StoredBrand)
+async def get_brand(
+    store: str,
+    db: Session = Depends(get_db),
+    timings: PhaseTimings = Depends(get_server_timing)
+):
+    """
+    Returns a persisted brand from the database, without scraping it again.
+    """
+    try:
+        with timings.phase("db"):
+            db_brand = await run_in_threadpool(stored_brand, store, db)
+            return await run_in_threadpool(operations.get_stored_brand, db, db_brand)
+    except SQLAlchemyError as e:
+        logger.exception(f"Database error while reading brand {store}")
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
+
+@app.get("/brands/{store}/products", response_model=ProductPage)
+async def get_brand_products(
+    store: str,
+    vendor: Optional[str] = None,
+    product_type: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    after: Optional[int] = Query(None, description="The next_cursor of the previous page."),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    timings: PhaseTimings = Depends(get_server_timing)
+):
+    """
+    Pages through a persisted brand's products, optionally filtered by vendor,
+    product type and price range.
+    """
+    try:
+        with timings.phase("db"):
+            db_brand = await run_in_threadpool(stored_brand, store, db)
+            return await run_in_threadpool(
+                operations.list_brand_products, db, db_brand.id,
+                vendor=vendor, product_type=product_type, min_price=min_price, max_price=max_price, after=after, limit=limit,
+            )
+    except SQLAlchemyError as e:
+        logger.exception(f"Database error while reading products of {store}")
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
+
+@app.get("/brands/{store}/price-changes", response_model=PriceChanges)
+async def get_price_changes(
+    store: str,
+    since: Optional[datetime] = Query(None, description="Compare against the last snapshot taken at or before this time; the previous snapshot when omitted."),
+    limit: int = Query(100, ge=1, le=10000, description="Most price changes and new/removed product ids to list."),
+    price_history: Optional[PriceHistory] = Depends(get_price_history),
+    timings: PhaseTimings = Depends(get_server_timing)
+):
+    """
+    Compares a store's latest price snapshot with an earlier one: price moves,
+    new and removed products, availability flips and per-vendor price statistics.
+    """
+    if price_history is None:
+        raise HTTPException(status_code=404, detail="Price history is disabled (PRICE_HISTORY_DIR is not set).")
+    with timings.phase("analytics"):
+        store_url = price_history.find_store(store_url_candidates(store))
+        changes = await run_in_threadpool(price_history.price_changes, store_url, since, limit) if store_url else None
+    if changes is None:
+        raise HTTPException(status_code=404, detail="Fewer than two price snapshots recorded for this store.")
+    return changes
+
+@app.get("/export/{table}")
+async def export_table(
+    table: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False, description="gzip the export (served as a .gz attachment)."),
+):
+    """
+    Streams a whole stored table (brands or products) as NDJSON or CSV, read through a
+    server-side cursor in chunks, so memory use doesn't grow with the table.
+    """
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail="Table not found.")
+    chunks = iter_export(table, format, compress=gzip)
+    try:
+        # Start the query before responding so an unreachable database is still a 500.
+        first_chunk = await run_in_threadpool(next, chunks)
+    except SQLAlchemyError as e:
+        logger.exception(f"Database error while exporting {table}")
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
+    return StreamingResponse(
+        itertools.chain([first_chunk], chunks),
+        media_type="application/gzip" if gzip else EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(table, format, gzip)}"'},
+    )
+
+@app.post("/tracked-stores", response_model=TrackedStore, status_code=201)
+async def track_store(
+    request: TrackStoreRequest,
+    db: Session = Depends(get_db),
+    scheduler: Optional[RecrawlScheduler] = Depends(get_scheduler)
+):
+    """
+    Adds a store to the re-crawl schedule. It is crawled right away, then at an
+    interval that adapts to how often its catalog changes.
+    """
+    store_url = normalize_store_url(str(request.website_url))
+    try:
+        tracked = await run_in_threadpool(operations.track_brand, db, store_url, RECRAWL_INITIAL_INTERVAL, time.time())
+    except SQLAlchemyError as e:
+        logger.exception(f"Database error while tracking {store_url}")
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
+    if scheduler is not None:
+        scheduler.wake()
+    return tracked
+
+@app.get("/tracked-stores", response_model=List[TrackedStore])
+async def list_tracked_stores(db: Session = Depends(get_db)):
+    """Tracked stores with their re-crawl schedule, next due first."""
+    try:
+        return await run_in_threadpool(operations.list_tracked_brands, db, RECRAWL_INITIAL_INTERVAL)
+    except SQLAlchemyError as e:
+        logger.exception("Database error while listing tracked stores")
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
+
+@app.delete("/tracked-stores/{store}", status_code=204)
+async def untrack_store(store: str, db: Session = Depends(get_db)):
+    """Stops re-crawling a store; what was persisted for it is kept."""
+    store_urls = store_url_candidates(store)
+    try:
+        untracked = await run_in_threadpool(operations.untrack_brand, db, store_urls) if store_urls else False
+    except SQLAlchemyError as e:
+        logger.exception(f"Database error while untracking {store}")
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
+    if not untracked:
+        raise HTTPException(status_code=404, detail="Store is not tracked.")
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(request: ScrapeRequest, job_queue: JobQueue = Depends(get_job_queue)):
+    """
+    Queues a scrape and returns its job id right away; poll GET /jobs/{job_id} for progress.
+    """
+    try:
+        job = job_queue.submit(str(request.website_url), fields=request.fields)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    logger.info(f"Queued job {job.id} for URL: {request.website_url}")
+    return job.to_status()
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job_status(job_id: str, job_queue: JobQueue = Depends(get_job_queue)):
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_status()
+
+@app.get("/jobs/{job_id}/result", response_model=BrandInsights)
+async def get_job_result(job_id: str, job_queue: JobQueue = Depends(get_job_queue)):
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}.")
+    if job.status == "failed":
+        raise HTTPException(status_code=job.error_status_code, detail=job.error)
+    return job.result
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request, scrape and per-phase latency histograms and scrape counters, in Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/coalescing", response_model=CoalescingStats)
+async def get_coalescing_stats():
+    """How many scrapes were served by joining an identical scrape already in flight."""
+    return scrape_flights.stats()
+
+@app.get("/metrics/extraction-plans", response_model=ExtractionPlanStats)
+async def get_extraction_plan_stats(extraction_plans: Optional[ExtractionPlans] = Depends(get_extraction_plans)):
+    """How often scrapes went straight to a FAQ layout learned for the store or its theme."""
+    if extraction_plans is None:
+        raise HTTPException(status_code=404, detail="Extraction plan caching is disabled (THEME_PLAN_CACHE_SIZE is 0).")
+    return extraction_plans.stats()
+
+@app.get("/metrics/scheduler", response_model=SchedulerStats)
+async def get_scheduler_stats(scheduler: Optional[RecrawlScheduler] = Depends(get_scheduler)):
+    """What scheduled re-crawls have cost in upstream requests and found in changes."""
+    if scheduler is None:
+        raise HTTPException(status_code=404, detail="The re-crawl scheduler is disabled (set SCHEDULER_ENABLED=true to run it).")
+    return scheduler.stats()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Shopify Insights Fetcher API!"}
\ No newline at end of file
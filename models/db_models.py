@@ -32,24 +32,47 @@
 #     brand_id = Column(Integer, ForeignKey("brands.id"))
 #     brand = relationship("Brand", back_populates="products")
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import BigInteger, Boolean, Column, Index, Integer, String, Float, ForeignKey
 from sqlalchemy.orm import relationship
 from database.database import Base
 
 class Brand(Base):
     __tablename__ = "brands"
+    # The re-crawl scheduler looks for tracked brands whose next_crawl_at has passed.
+    __table_args__ = (Index("ix_brands_tracked_next_crawl", "tracked", "next_crawl_at"),)
     id = Column(Integer, primary_key=True, index=True)
     store_url = Column(String(255), unique=True, index=True)
     brand_context = Column(String(2000))
+    # Newest products.json updated_at seen by the last complete catalog crawl
+    catalog_watermark = Column(String(40))
+    # Re-crawl schedule kept by jobs.scheduler; times are Unix timestamps
+    tracked = Column(Boolean, default=False, nullable=False)
+    recrawl_interval = Column(Float)
+    next_crawl_at = Column(Float)
+    last_crawled_at = Column(Float)
+    last_changed_at = Column(Float)
+    crawl_failures = Column(Integer, default=0, nullable=False)
     products = relationship("Product", back_populates="brand")
 
 class Product(Base):
     __tablename__ = "products"
+    # GET /brands/{store}/products pages by shopify_product_id within a brand, optionally
+    # filtered on one of these columns, so each filter gets its own (brand_id, ...) index.
+    __table_args__ = (
+        Index("ix_products_brand_product", "brand_id", "shopify_product_id"),
+        Index("ix_products_brand_vendor", "brand_id", "vendor", "shopify_product_id"),
+        Index("ix_products_brand_type", "brand_id", "product_type", "shopify_product_id"),
+        Index("ix_products_brand_price", "brand_id", "price"),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    shopify_product_id = Column(Integer, unique=True)
+    # Shopify ids overflow a 32-bit INT
+    shopify_product_id = Column(BigInteger, unique=True)
     title = Column(String(255))
     vendor = Column(String(255))
+    product_type = Column(String(255))
     price = Column(Float)
+    # scraper.crawl_state.product_hash of the products.json entry, for incremental re-crawls
+    content_hash = Column(BigInteger)
     brand_id = Column(Integer, ForeignKey("brands.id"))
     brand = relationship("Brand", back_populates="products")
 
@@ -1,5 +1,13 @@
+from datetime import datetime
 from pydantic import BaseModel, HttpUrl, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
+
+class ProductVariant(BaseModel):
+    id: int
+    title: Optional[str] = None
+    price: float
+    available: Optional[bool] = None
+    sku: Optional[str] = None
 
 class Product(BaseModel):
     id: int
@@ -8,6 +16,8 @@ class Product(BaseModel):
     product_type: str
     price: float
     url: HttpUrl
+    updated_at: Optional[datetime] = None
+    variants: List[ProductVariant] = []
 
 class FAQItem(BaseModel):
     question: str
@@ -24,17 +34,138 @@ class ContactDetails(BaseModel):
     emails: List[str] = []
     phone_numbers: List[str] = []
 
+# The BrandInsights sections a caller can ask for; store_url is always returned.
+InsightField = Literal[
+    "brand_context", "product_catalog", "hero_products", "social_handles", "contact_details",
+    "privacy_policy_url", "refund_policy_url", "faqs", "important_links",
+]
+
 class BrandInsights(BaseModel):
     store_url: HttpUrl
     brand_context: Optional[str] = Field(None, description="About Us section content.")
     product_catalog: List[Product] = []
     hero_products: List[Product] = []
-    social_handles: SocialHandles
-    contact_details: ContactDetails
+    social_handles: SocialHandles = Field(default_factory=SocialHandles)
+    contact_details: ContactDetails = Field(default_factory=ContactDetails)
     privacy_policy_url: Optional[HttpUrl] = None
     refund_policy_url: Optional[HttpUrl] = None
     faqs: List[FAQItem] = []
     important_links: dict[str, Optional[HttpUrl]] = {}
+    degraded_sections: List[InsightField] = Field([], description="Sections that may be incomplete because a page they are built from could not be fetched.")
 
 class ScrapeRequest(BaseModel):
-    website_url: HttpUrl
\ No newline at end of file
+    website_url: HttpUrl
+    fields: Optional[List[InsightField]] = Field(None, min_length=1, description="Sections to scrape; all of them when omitted. Unrequested sections come back empty.")
+
+class BatchScrapeRequest(BaseModel):
+    stores: List[ScrapeRequest] = Field(..., min_length=1)
+
+class BatchScrapeResult(BaseModel):
+    website_url: HttpUrl
+    ok: bool
+    insights: Optional[BrandInsights] = None
+    error: Optional[str] = None
+
+class JobStatus(BaseModel):
+    job_id: str
+    website_url: HttpUrl
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    pages_fetched: int = 0
+    products_parsed: int = 0
+    error: Optional[str] = None
+
+class CoalescingStats(BaseModel):
+    requests: int
+    coalesced: int = Field(..., description="Scrapes that joined one already in flight instead of starting their own.")
+    hit_rate: float
+    in_flight: int
+
+class ExtractionPlanStats(BaseModel):
+    stores: int = Field(..., description="Stores with a learned FAQ layout.")
+    themes: int = Field(..., description="Themes with a learned FAQ layout.")
+    store_hits: int
+    theme_hits: int
+    misses: int
+    fallbacks: int = Field(..., description="FAQ pages the learned layout found nothing on, where another layout matched.")
+    hit_rate: float
+
+class CatalogRefreshSummary(BaseModel):
+    store_url: HttpUrl
+    changed: int
+    deleted: int
+    unchanged: int
+    complete: bool
+
+class StoredBrand(BaseModel):
+    store_url: HttpUrl
+    brand_context: Optional[str] = None
+    product_count: int
+    catalog_watermark: Optional[str] = Field(None, description="Newest product updated_at seen by the last complete catalog crawl.")
+
+class StoredProduct(BaseModel):
+    id: int = Field(..., description="The Shopify product id.")
+    title: Optional[str] = None
+    vendor: Optional[str] = None
+    product_type: Optional[str] = None
+    price: Optional[float] = None
+
+class PriceChange(BaseModel):
+    product_id: int
+    variant_id: int
+    vendor: str
+    old_price: float
+    new_price: float
+    change: float
+    change_pct: Optional[float] = Field(None, description="Null when the old price was zero.")
+
+class VendorPriceStats(BaseModel):
+    vendor: str
+    variants: int
+    mean_price: float
+    median_price: float
+    min_price: float
+    max_price: float
+    price_changes: int
+    mean_change_pct: Optional[float] = None
+
+class PriceChanges(BaseModel):
+    store_url: HttpUrl
+    from_snapshot: datetime
+    to_snapshot: datetime
+    snapshots: int = Field(..., description="Snapshots recorded for the store so far.")
+    variants_compared: int
+    price_changes_total: int
+    price_changes: List[PriceChange] = Field(..., description="The largest moves first, up to `limit`.")
+    new_products: int
+    removed_products: int
+    new_product_ids: List[int] = Field(..., description="Up to `limit` ids.")
+    removed_product_ids: List[int] = Field(..., description="Up to `limit` ids.")
+    became_available: int
+    became_unavailable: int
+    vendors: List[VendorPriceStats] = Field(..., description="Statistics over the latest snapshot's variants.")
+
+class TrackStoreRequest(BaseModel):
+    website_url: HttpUrl
+
+class TrackedStore(BaseModel):
+    store_url: HttpUrl
+    recrawl_interval: float = Field(..., description="Seconds between re-crawls, adapted to how often the catalog changes.")
+    next_crawl_at: Optional[float] = None
+    last_crawled_at: Optional[float] = None
+    last_changed_at: Optional[float] = None
+    crawl_failures: int = Field(..., description="Consecutive failed re-crawls; each one doubles the wait before the next.")
+
+class SchedulerStats(BaseModel):
+    running: int
+    crawls: int
+    crawls_with_changes: int
+    failures: int
+    pages_fetched: int = Field(..., description="Upstream requests made by scheduled re-crawls.")
+    products_changed: int = Field(..., description="Changed or deleted products the re-crawls found.")
+
+class ProductPage(BaseModel):
+    products: List[StoredProduct]
+    next_cursor: Optional[int] = Field(None, description="Pass as `after` to get the next page; null on the last page.")
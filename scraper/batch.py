@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import urlsplit
+from models.pydantic_models import BatchScrapeResult, ScrapeRequest
+from scraper.coalesce import SingleFlight
+from scraper.scraper import ShopifyScraper
+
+logger = logging.getLogger(__name__)
+
+# Stores scraped at once across every batch running in this process.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "32"))
+# Stores scraped at once on any single host, so one origin never sees a burst from us.
+BATCH_PER_HOST_CONCURRENCY = int(os.getenv("BATCH_PER_HOST_CONCURRENCY", "2"))
+
+class BatchRunner:
+    """
+    Runs many store scrapes under a global concurrency limit and a per-host limit.
+    One instance is meant to be shared by the whole app so the limits hold across batches.
+    Scrapes go through `flights`, so duplicate stores are scraped once.
+    """
+    def __init__(self, concurrency: int = BATCH_CONCURRENCY, per_host: int = BATCH_PER_HOST_CONCURRENCY, flights: Optional[SingleFlight] = None):
+        self.flights = flights or SingleFlight()
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self._global_slots = asyncio.Semaphore(self.concurrency)
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._host_users: Dict[str, int] = defaultdict(int)
+
+    async def _scrape_one(self, url: str, fields: Optional[List[str]], scraper_options: dict) -> BatchScrapeResult:
+        host = urlsplit(url).netloc.lower()
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        self._host_users[host] += 1
+        try:
+            # Take the host slot first so a store queued behind its own host never holds a global slot.
+            async with self._host_slots[host], self._global_slots:
+                insights = await self.flights.run(ShopifyScraper(url, fields=fields, **scraper_options))
+            return BatchScrapeResult(website_url=url, ok=True, insights=insights)
+        except asyncio.TimeoutError:
+            return BatchScrapeResult(website_url=url, ok=False, error="Timed out while scraping the website.")
+        except ValueError as e:
+            return BatchScrapeResult(website_url=url, ok=False, error=f"Website not found or failed to process: {e}")
+        except Exception as e:
+            logger.exception(f"An internal error occurred for {url}")
+            return BatchScrapeResult(website_url=url, ok=False, error=f"An internal server error occurred: {e}")
+        finally:
+            self._host_users[host] -= 1
+            if not self._host_users[host]:
+                del self._host_users[host]
+                del self._host_slots[host]
+
+    async def run(self, stores: List[ScrapeRequest], **scraper_options) -> AsyncIterator[BatchScrapeResult]:
+        """
+        Yields one result per store, in completion order. A failed store never aborts the batch.
+        Each store is scraped for its own `fields`; `scraper_options` are passed to every
+        ShopifyScraper (shared client, cache, ...).
+        """
+        tasks = [asyncio.ensure_future(self._scrape_one(str(store.website_url), store.fields, scraper_options)) for store in stores]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
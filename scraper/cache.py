@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached page is served without asking the store again.
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+# Memory budget for the in-process tier, counted in response bytes.
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Optional on-disk tier; disabled unless a directory is configured.
+CACHE_DIR = os.getenv("CACHE_DIR")
+# Size budget of the on-disk tier, in file bytes. Least recently used files are deleted past it.
+CACHE_DISK_MAX_BYTES = int(os.getenv("CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+@dataclass
+class CachedResponse:
+    content: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    stored_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.content) + len(self.etag or "") + len(self.last_modified or "")
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    def validators(self) -> dict:
+        """Conditional request headers for revalidating a stale entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class ResponseCache(ABC):
+    """Interface for the cache under ShopifyScraper's fetches, keyed by full URL."""
+    ttl: float = CACHE_TTL
+
+    @abstractmethod
+    async def get(self, url: str) -> Optional[CachedResponse]:
+        ...
+
+    @abstractmethod
+    async def set(self, url: str, entry: CachedResponse) -> None:
+        ...
+
+class MemoryCache(ResponseCache):
+    """LRU cache that evicts least recently used entries once `max_bytes` is exceeded."""
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+
+    async def get(self, url: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries.move_to_end(url)
+        return entry
+
+    async def set(self, url: str, entry: CachedResponse) -> None:
+        old = self._entries.pop(url, None)
+        if old is not None:
+            self.current_bytes -= old.size
+        if entry.size > self.max_bytes:
+            return
+        self._entries[url] = entry
+        self.current_bytes += entry.size
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.size
+
+class DiskCache(ResponseCache):
+    """
+    One file per URL under `directory`: a JSON header line with the validators, then
+    the raw content. Reads touch the file, and once the files pass `max_bytes` the
+    least recently used are deleted until they fit in 90% of it. File I/O runs off the
+    event loop.
+    """
+    def __init__(self, directory: str, ttl: float = CACHE_TTL, max_bytes: int = CACHE_DISK_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.current_bytes = sum(size for _, _, size in self._files())
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest())
+
+    def _files(self):
+        """(path, last used, size) of every entry file, tolerating files deleted meanwhile."""
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def _read(self, url: str) -> Optional[CachedResponse]:
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                content = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry for {url}: {e}")
+            return None
+        if not isinstance(header, dict) or header.get("url") != url:
+            return None
+        return CachedResponse(content=content, etag=header.get("etag"), last_modified=header.get("last_modified"), stored_at=header.get("stored_at", 0.0))
+
+    def _write(self, url: str, entry: CachedResponse) -> None:
+        path = self._path(url)
+        header = {"url": url, "etag": entry.etag, "last_modified": entry.last_modified, "stored_at": entry.stored_at}
+        data = json.dumps(header).encode() + b"\n" + entry.content
+        if len(data) > self.max_bytes:
+            return
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.current_bytes += len(data) - replaced
+            over_budget = self.current_bytes > self.max_bytes
+        if over_budget:
+            self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            files = sorted(self._files(), key=lambda file: file[1])
+            total = sum(size for _, _, size in files)
+            target = self.max_bytes * 0.9
+            for path, _, size in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self.current_bytes = total
+
+    async def get(self, url: str) -> Optional[CachedResponse]:
+        return await asyncio.to_thread(self._read, url)
+
+    async def set(self, url: str, entry: CachedResponse) -> None:
+        try:
+            await asyncio.to_thread(self._write, url, entry)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry for {url}: {e}")
+
+class TieredCache(ResponseCache):
+    """Memory in front of disk: disk hits are promoted into memory, writes go to both."""
+    def __init__(self, memory: MemoryCache, disk: DiskCache):
+        self.memory = memory
+        self.disk = disk
+        self.ttl = memory.ttl
+
+    async def get(self, url: str) -> Optional[CachedResponse]:
+        entry = await self.memory.get(url)
+        if entry is None:
+            entry = await self.disk.get(url)
+            if entry is not None:
+                await self.memory.set(url, entry)
+        return entry
+
+    async def set(self, url: str, entry: CachedResponse) -> None:
+        await self.memory.set(url, entry)
+        await self.disk.set(url, entry)
+
+def create_response_cache() -> ResponseCache:
+    memory = MemoryCache()
+    if CACHE_DIR:
+        return TieredCache(memory, DiskCache(CACHE_DIR))
+    return memory
+
+# FastAPI dependency for the application-lifetime cache created at startup
+def get_response_cache(request: Request) -> ResponseCache:
+    return request.app.state.response_cache
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Tuple
+from models.pydantic_models import BrandInsights, CoalescingStats
+from scraper.metrics import METRICS_ENABLED, SCRAPE_REQUESTS, SCRAPES_COALESCED
+from scraper.scraper import ShopifyScraper, normalize_store_url
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Flight:
+    """One in-progress scrape that every concurrent caller for the same store waits on."""
+    scraper: ShopifyScraper
+    task: asyncio.Future
+
+    async def wait(self) -> BrandInsights:
+        # Shielded so one caller going away never cancels the scrape the others wait on.
+        return await asyncio.shield(self.task)
+
+class SingleFlight:
+    """
+    Coalesces concurrent scrapes of the same store into one. Scrapes are keyed on
+    the normalized store URL and the requested fields; a scrape started while an
+    identical one is in flight joins it and gets the same BrandInsights or error.
+    Nothing is kept once a flight lands, so later requests always scrape afresh.
+    One instance is meant to be shared by the whole app.
+    """
+    def __init__(self):
+        self._flights: Dict[Tuple[str, frozenset], Flight] = {}
+        self.requests = 0
+        self.coalesced = 0
+
+    def join(self, scraper: ShopifyScraper) -> Flight:
+        """Returns the flight for `scraper`'s store, starting `scraper` as a new one if none is running."""
+        key = (normalize_store_url(scraper.base_url), scraper.fields)
+        self.requests += 1
+        if METRICS_ENABLED:
+            SCRAPE_REQUESTS.inc()
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            if METRICS_ENABLED:
+                SCRAPES_COALESCED.inc()
+            logger.debug(f"Coalesced a scrape of {key[0]} into the one in flight")
+            return flight
+
+        flight = Flight(scraper=scraper, task=asyncio.ensure_future(scraper.run()))
+        self._flights[key] = flight
+        flight.task.add_done_callback(lambda task: self._land(key, flight))
+        return flight
+
+    def _land(self, key: Tuple[str, frozenset], flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Mark the error as retrieved even if every caller has gone away.
+            flight.task.exception()
+
+    async def run(self, scraper: ShopifyScraper) -> BrandInsights:
+        return await self.join(scraper).wait()
+
+    def stats(self) -> CoalescingStats:
+        return CoalescingStats(
+            requests=self.requests,
+            coalesced=self.coalesced,
+            hit_rate=self.coalesced / self.requests if self.requests else 0.0,
+            in_flight=len(self._flights),
+        )
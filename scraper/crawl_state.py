@@ -0,0 +1,56 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import unquote
+from models.pydantic_models import Product
+
+@dataclass
+class CrawlState:
+    """What the previous crawl of a store saw: its newest updated_at and a hash per product."""
+    watermark: Optional[str] = None
+    hashes: Dict[int, int] = field(default_factory=dict)
+
+@dataclass
+class CatalogRefresh:
+    changed: List[Product] = field(default_factory=list)
+    hashes: Dict[int, int] = field(default_factory=dict)
+    deleted_ids: List[int] = field(default_factory=list)
+    unchanged: int = 0
+    watermark: Optional[str] = None
+    # False when paging stopped early; deletions can't be known then.
+    complete: bool = True
+    # The homepage's brand context; None when it couldn't be read, which keeps the stored one.
+    brand_context: Optional[str] = None
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        # datetime.fromisoformat only understands a trailing "Z" from Python 3.11.
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def _content_hash(content: list) -> int:
+    digest = hashlib.blake2b(json.dumps(content, separators=(",", ":")).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+def product_hash(item: dict) -> int:
+    """Signed 64-bit hash of the products.json fields the scraper keeps."""
+    content = [
+        item.get('title'), item.get('vendor'), item.get('product_type'), item.get('handle'),
+        # products.json prices are strings; as floats they hash the same as a parsed Product's.
+        [(variant.get('id'), variant.get('title'), None if variant.get('price') is None else float(variant['price']), variant.get('available')) for variant in item.get('variants') or []],
+    ]
+    return _content_hash(content)
+
+def model_hash(product: Product) -> int:
+    """product_hash of the products.json entry `product` was parsed from, for products without it at hand."""
+    handle = unquote(str(product.url).rsplit('/products/', 1)[-1])
+    content = [
+        product.title, product.vendor, product.product_type, handle,
+        [(variant.id, variant.title, variant.price, variant.available) for variant in product.variants],
+    ]
+    return _content_hash(content)
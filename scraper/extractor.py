@@ -0,0 +1,224 @@
+"""
+Single-pass homepage extraction.
+
+ShopifyScraper's per-section extractors (find_important_links, extract_social_handles,
+extract_contact_details, _homepage_product_handles) each walk the whole tree. This
+module visits every anchor once and reads the page text once, using precompiled
+patterns, and produces the same output. Given a store's ExtractionPlan
+(scraper.themes), hero products come from the theme's content sections only and its
+contact page path wins over other "contact" links. Run it as a script to check the
+output under GENERIC_PLAN, which unrecognised themes get, against the per-section
+extractors:
+
+    python -m scraper.extractor https://store.example.com page.html ...
+"""
+import functools
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+from scraper.themes import FAQ_LAYOUTS, GENERIC_PLAN, ExtractionPlan, FaqLayout
+
+logger = logging.getLogger(__name__)
+
+# Any BeautifulSoup tree builder; "lxml" (pip install lxml) is several times faster
+# than the pure-Python "html.parser" on large themes.
+HTML_PARSER = os.getenv("HTML_PARSER", "html.parser")
+
+LINK_KEYWORDS = {
+    "contact": "contact_us",
+    "privacy": "privacy_policy",
+    "refund": "refund_policy",
+    "return": "refund_policy",
+    "blog": "blogs",
+    "track": "track_order",
+    "faq": "faqs",
+    "frequently asked questions": "faqs"
+}
+# Zero-width lookahead so keywords that overlap in a string are all reported, like `in` does.
+LINK_KEYWORD_RE = re.compile("(?=(" + "|".join(re.escape(keyword) for keyword in LINK_KEYWORDS) + "))")
+
+SOCIAL_PATTERNS = {
+    'instagram': re.compile(r'instagram\.com/([a-zA-Z0-9_\.]+)'),
+    'facebook': re.compile(r'facebook\.com/([a-zA-Z0-9_\.]+)'),
+    'twitter': re.compile(r'twitter\.com/([a-zA-Z0-9_]+)'),
+    'tiktok': re.compile(r'tiktok\.com/@([a-zA-Z0-9_\.]+)'),
+    'youtube': re.compile(r'youtube\.com/(user/|channel/|c/)?([a-zA-Z0-9_\-]+)'),
+}
+# Cheap pre-check: an href can only match a platform pattern if it contains its domain.
+SOCIAL_DOMAIN_RE = re.compile(r'instagram\.com/|facebook\.com/|twitter\.com/|tiktok\.com/@|youtube\.com/')
+
+EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+PHONE_RE = re.compile(r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}')
+
+@dataclass
+class PageContacts:
+    emails: List[str] = field(default_factory=list)
+    phone_numbers: List[str] = field(default_factory=list)
+
+@dataclass
+class HomepageData:
+    links: Dict[str, Optional[str]]
+    social_handles: Dict[str, str]
+    hero_handles: List[str]
+    contacts: PageContacts
+    brand_context: Optional[str] = None
+
+@dataclass
+class FaqPage:
+    items: List[Tuple[str, str]] = field(default_factory=list)
+    # The FAQ_LAYOUTS entry the items were found with; None if no layout matched.
+    layout: Optional[str] = None
+
+def make_soup(content: bytes, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    return BeautifulSoup(content, _parser(), parse_only=parse_only)
+
+# Resolved once per process, so a missing parser is warned about once rather than on every parse.
+@functools.lru_cache(maxsize=None)
+def _parser() -> str:
+    if builder_registry.lookup(HTML_PARSER) is None:
+        logger.warning(f"HTML_PARSER={HTML_PARSER} is not available; falling back to html.parser")
+        return "html.parser"
+    return HTML_PARSER
+
+def extract_contacts(soup: BeautifulSoup) -> PageContacts:
+    text = soup.get_text()
+    return PageContacts(
+        emails=list(set(EMAIL_RE.findall(text))),
+        phone_numbers=list(set(PHONE_RE.findall(text))),
+    )
+
+def _product_handle(href: str) -> str:
+    return href.split('/products/')[-1].split('?')[0]
+
+def extract_homepage(soup: BeautifulSoup, base_url: str, plan: Optional[ExtractionPlan] = None) -> HomepageData:
+    links = {"contact_us": None, "privacy_policy": None, "refund_policy": None, "blogs": None, "track_order": None, "faqs": None}
+    social_handles = {}
+    hero_handles = {}
+    contact_page = None
+
+    for a_tag in soup.find_all('a', href=True):
+        href = a_tag['href']
+
+        link_text = a_tag.get_text(strip=True).lower()
+        for text in (link_text, href):
+            for match in LINK_KEYWORD_RE.finditer(text):
+                key = LINK_KEYWORDS[match.group(1)]
+                if not links[key]:
+                    links[key] = urljoin(base_url, href)
+
+        if len(social_handles) < len(SOCIAL_PATTERNS) and SOCIAL_DOMAIN_RE.search(href):
+            for platform, pattern in SOCIAL_PATTERNS.items():
+                if platform not in social_handles and pattern.search(href):
+                    social_handles[platform] = href
+
+        if "/products/" in href:
+            hero_handles[_product_handle(href)] = None
+
+        if plan is not None and plan.contact_paths and contact_page is None and "/pages/" in href and urlsplit(href).path.rstrip('/').endswith(plan.contact_paths):
+            contact_page = href
+
+    if contact_page is not None:
+        links["contact_us"] = urljoin(base_url, contact_page)
+    if plan is not None and plan.hero_sections:
+        section_handles = {}
+        for section in soup.select(plan.hero_sections):
+            for a_tag in section.find_all('a', href=True):
+                if "/products/" in a_tag['href']:
+                    section_handles[_product_handle(a_tag['href'])] = None
+        # A theme whose sections we can't find keeps every product link on the page.
+        if section_handles:
+            hero_handles = section_handles
+
+    brand_description = soup.find('meta', attrs={'name': 'description'})
+    return HomepageData(
+        links=links,
+        social_handles=social_handles,
+        hero_handles=list(hero_handles),
+        contacts=extract_contacts(soup),
+        brand_context=brand_description['content'] if brand_description else None,
+    )
+
+def _faq_items(soup: BeautifulSoup, layout: FaqLayout) -> List[Tuple[str, str]]:
+    faq_list = []
+    for item in soup.select(layout.selector):
+        question_tag = item.select_one(layout.question)
+        answer_tag = item.select_one(layout.answer)
+        if question_tag and answer_tag:
+            question = question_tag.get_text(strip=True)
+            answer = answer_tag.get_text(strip=True, separator='\n')
+            faq_list.append((question, answer))
+    return faq_list
+
+def extract_faq_items(soup: BeautifulSoup, layouts: Iterable[str] = tuple(FAQ_LAYOUTS)) -> FaqPage:
+    """The items of the first of `layouts` that finds any."""
+    for name in layouts:
+        items = _faq_items(soup, FAQ_LAYOUTS[name])
+        if items:
+            return FaqPage(items=items, layout=name)
+    return FaqPage()
+
+# Entry points for the parse pool: raw page bytes in, compact picklable results out.
+
+def parse_homepage(content: bytes, base_url: str, plan: Optional[ExtractionPlan] = None) -> HomepageData:
+    return extract_homepage(make_soup(content), base_url, plan)
+
+def parse_contacts(content: bytes) -> PageContacts:
+    return extract_contacts(make_soup(content))
+
+def parse_faqs(content: bytes, plan: ExtractionPlan = GENERIC_PLAN) -> FaqPage:
+    if plan.faq_layout is not None:
+        # Only the known layout's items are built into a tree; the rest of the page is skipped.
+        page = extract_faq_items(make_soup(content, FAQ_LAYOUTS[plan.faq_layout].strainer()), (plan.faq_layout,))
+        if page.items:
+            return page
+    return extract_faq_items(make_soup(content), plan.faq_layouts)
+
+def check_parity(base_url: str, content: bytes) -> List[str]:
+    """
+    Compares extract_homepage on the configured HTML_PARSER, under GENERIC_PLAN as a
+    store of an unrecognised theme is scraped, with ShopifyScraper's per-section
+    extractors on html.parser; returns the differences, if any. A recognised theme's
+    plan reads hero products and the contact link differently on purpose.
+    """
+    from models.pydantic_models import SocialHandles
+    from scraper.scraper import ShopifyScraper
+    scraper = ShopifyScraper(base_url)
+    reference_soup = BeautifulSoup(content, 'html.parser')
+    reference_contacts = scraper.extract_contact_details(reference_soup)
+    reference = {
+        "links": scraper.find_important_links(reference_soup),
+        "social_handles": scraper.extract_social_handles(reference_soup),
+        "hero_handles": scraper._homepage_product_handles(reference_soup),
+        "emails": set(reference_contacts.emails),
+        "phone_numbers": set(reference_contacts.phone_numbers),
+        "brand_context": scraper.extract_brand_context(reference_soup),
+    }
+    data = extract_homepage(make_soup(content), scraper.base_url, GENERIC_PLAN)
+    single_pass = {
+        "links": data.links,
+        "social_handles": SocialHandles(**data.social_handles),
+        "hero_handles": set(data.hero_handles),
+        "emails": set(data.contacts.emails),
+        "phone_numbers": set(data.contacts.phone_numbers),
+        "brand_context": data.brand_context,
+    }
+    return [f"{key}: {reference[key]!r} != {single_pass[key]!r}" for key in reference if reference[key] != single_pass[key]]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("usage: python -m scraper.extractor <store-url> <page.html> [<page.html> ...]")
+    failed = False
+    for path in sys.argv[2:]:
+        with open(path, "rb") as f:
+            differences = check_parity(sys.argv[1], f.read())
+        print(f"{path}: {'OK' if not differences else 'MISMATCH'}")
+        for difference in differences:
+            print(f"  {difference}")
+        failed = failed or bool(differences)
+    sys.exit(1 if failed else 0)
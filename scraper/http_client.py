@@ -0,0 +1,164 @@
+import asyncio
+import importlib.util
+import logging
+import os
+from collections import OrderedDict
+from typing import AsyncIterator, Callable
+import httpx
+from fastapi import Request
+from scraper.metrics import RETRIES
+from scraper.throttle import HTTP_RETRIES, RETRY_MAX_DELAY, RETRY_STATUSES, THROTTLE_STATUSES, HostThrottle, backoff_delay, retry_after
+
+logger = logging.getLogger(__name__)
+
+# Connection pool shared by every scrape in the process.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "6"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "100"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+# HTTP/2 needs the optional `h2` package (pip install "httpx[http2]").
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+# Hosts whose throttle state is kept; past it, the least recently used idle hosts are forgotten.
+HTTP_MAX_TRACKED_HOSTS = int(os.getenv("HTTP_MAX_TRACKED_HOSTS", "10000"))
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Wraps a response body and runs `release` once the body is closed."""
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release:
+                self._release()
+                self._release = None
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Paces every request through one token bucket, whatever host it is for."""
+    def __init__(self, transport: httpx.AsyncBaseTransport, rate: float):
+        self._transport = transport
+        self._throttle = HostThrottle(HTTP_MAX_CONNECTIONS, rate=rate, burst=max(1, int(rate)))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # Only the pacing is wanted; concurrency is left to the pool and the per-host limits.
+        await self._throttle.acquire()
+        self._throttle.release()
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx only caps the pool as a whole; this paces and caps the requests open against
+    a single host (see HostThrottle), holding the slot until the response body is
+    closed. `per_host` is the ceiling the adaptive window grows back to. Throttled or
+    failing GETs (429, 502-504) are retried up to `retries` times, honouring Retry-After.
+    At most about `max_hosts` throttles are kept; a host's is only forgotten while idle.
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport, per_host: int, retries: int = HTTP_RETRIES, max_hosts: int = HTTP_MAX_TRACKED_HOSTS):
+        self._transport = transport
+        self._per_host = max(1, per_host)
+        self._retries = max(0, retries)
+        self._max_hosts = max(1, max_hosts)
+        self._throttles: "OrderedDict[str, HostThrottle]" = OrderedDict()
+
+    def _throttle(self, host: str) -> HostThrottle:
+        throttle = self._throttles.get(host)
+        if throttle is not None:
+            self._throttles.move_to_end(host)
+            return throttle
+        # Evicted before the new throttle goes in, which is idle too and must not be dropped.
+        if len(self._throttles) >= self._max_hosts:
+            self._evict_idle()
+        throttle = self._throttles[host] = HostThrottle(self._per_host)
+        return throttle
+
+    def _evict_idle(self) -> None:
+        """Forgets idle hosts, least recently used first, down to 90% of the bound so this runs rarely."""
+        target = min(int(self._max_hosts * 0.9), self._max_hosts - 1)
+        for host, throttle in list(self._throttles.items()):
+            if len(self._throttles) <= target:
+                break
+            # A busy throttle stays, or a second one would let the host exceed its limits.
+            if throttle.idle():
+                del self._throttles[host]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        throttle = self._throttle(host)
+        retries = self._retries if request.method in ("GET", "HEAD") else 0
+        attempt = 0
+        while True:
+            await throttle.acquire()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except BaseException:
+                throttle.release()
+                raise
+            if response.status_code not in RETRY_STATUSES:
+                throttle.succeeded()
+                break
+            delay = retry_after(response)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            if response.status_code in THROTTLE_STATUSES:
+                throttle.throttled(min(delay, RETRY_MAX_DELAY))
+            if attempt >= retries or delay > RETRY_MAX_DELAY:
+                break
+            try:
+                await response.aclose()
+            finally:
+                # Also on cancellation, or the slot is lost for good once the window is down to one.
+                throttle.release()
+            logger.info(f"{host} answered {response.status_code}, retrying in {delay:.1f}s")
+            RETRIES.inc(status=response.status_code)
+            await asyncio.sleep(delay)
+            # Looked up again: an idle throttle may have been forgotten while this one slept.
+            throttle = self._throttle(host)
+            attempt += 1
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, throttle.release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+def create_http_client(requests_per_second: float = 0) -> httpx.AsyncClient:
+    """
+    Builds the pooled, keep-alive client used for scraping. Response compression is
+    negotiated by httpx itself: gzip and deflate always, plus br/zstd when the
+    `brotli`/`zstandard` packages are installed. A `requests_per_second` above zero
+    caps the client's total request rate across all hosts, retries included.
+    """
+    http2 = HTTP2_ENABLED
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed; using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = httpx.AsyncHTTPTransport(http2=http2, limits=limits)
+    if requests_per_second > 0:
+        transport = RateLimitedTransport(transport, requests_per_second)
+    transport = HostLimitedTransport(transport, HTTP_MAX_CONNECTIONS_PER_HOST)
+    return httpx.AsyncClient(headers=DEFAULT_HEADERS, follow_redirects=True, transport=transport)
+
+# FastAPI dependency for the application-lifetime client created at startup
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http_client
@@ -0,0 +1,150 @@
+import bisect
+import os
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, Sequence, Tuple
+from fastapi import Request
+
+# Per-phase timers, Server-Timing headers and /metrics; set to false to skip collecting them.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _label_set(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        self._values[tuple(str(labels[name]) for name in self.labels)] += amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for values, total in self._values.items():
+            yield f"{self.name}{_label_set(self.labels, values)} {total}"
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (plus +Inf), then the running sum.
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for values, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += count
+                yield f"{self.name}_bucket{_label_set((*self.labels, 'le'), (*values, bound))} {cumulative}"
+            yield f"{self.name}_sum{_label_set(self.labels, values)} {series[-1]}"
+            yield f"{self.name}_count{_label_set(self.labels, values)} {cumulative}"
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """The Prometheus text exposition format (version 0.0.4)."""
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+REGISTRY = Registry()
+REQUEST_DURATION = REGISTRY.histogram("shopify_insights_request_duration_seconds", "API request latency, up to the response headers.", ("route", "method", "status"))
+SCRAPE_DURATION = REGISTRY.histogram("shopify_insights_scrape_duration_seconds", "Wall time of a whole store scrape.", ("outcome",))
+SCRAPE_PHASE_DURATION = REGISTRY.histogram("shopify_insights_scrape_phase_seconds", "Time a scrape spent in each phase, summed over its concurrent fetches.", ("phase",))
+BYTES_FETCHED = REGISTRY.counter("shopify_insights_bytes_fetched_total", "Response body bytes downloaded from stores.")
+PAGES_FETCHED = REGISTRY.counter("shopify_insights_pages_fetched_total", "Store pages and /products.json pages fetched.")
+PRODUCTS_PARSED = REGISTRY.counter("shopify_insights_products_parsed_total", "Products validated into Product models.")
+CACHE_HITS = REGISTRY.counter("shopify_insights_cache_hits_total", "Fetches answered by the response cache, fresh or revalidated.")
+SCRAPE_REQUESTS = REGISTRY.counter("shopify_insights_scrape_requests_total", "Scrapes requested through the single-flight layer, coalesced or not.")
+SCRAPES_COALESCED = REGISTRY.counter("shopify_insights_scrapes_coalesced_total", "Scrape requests that joined an identical scrape already in flight.")
+RETRIES = REGISTRY.counter("shopify_insights_http_retries_total", "Store requests retried after a throttled or failing response.", ("status",))
+
+class _Phase:
+    __slots__ = ("timings", "name", "started")
+
+    def __init__(self, timings: "PhaseTimings", name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings.phases[self.name] += time.perf_counter() - self.started
+
+class _NoPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NO_PHASE = _NoPhase()
+
+class PhaseTimings:
+    """Seconds spent per named phase (fetch, extract, validate, db, ...) by one scrape or request."""
+    def __init__(self):
+        self.phases: Dict[str, float] = defaultdict(float)
+
+    def phase(self, name: str):
+        """Context manager adding the time spent inside it to `name`; free when metrics are disabled."""
+        return _Phase(self, name) if METRICS_ENABLED else _NO_PHASE
+
+    def merge(self, other: "PhaseTimings") -> None:
+        for name, seconds in other.phases.items():
+            self.phases[name] += seconds
+
+    def server_timing(self, total: float) -> str:
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+def record_scrape(timings: PhaseTimings, progress, outcome: str, seconds: float) -> None:
+    """Folds one finished scrape's timings and ScrapeProgress counters into the registry."""
+    if not METRICS_ENABLED:
+        return
+    SCRAPE_DURATION.observe(seconds, outcome=outcome)
+    for name, phase_seconds in timings.phases.items():
+        SCRAPE_PHASE_DURATION.observe(phase_seconds, phase=name)
+    BYTES_FETCHED.inc(progress.bytes_fetched)
+    PAGES_FETCHED.inc(progress.pages_fetched)
+    PRODUCTS_PARSED.inc(progress.products_parsed)
+    CACHE_HITS.inc(progress.cache_hits)
+
+# FastAPI dependency: the timings reported in this request's Server-Timing header
+def get_server_timing(request: Request) -> PhaseTimings:
+    timings = PhaseTimings()
+    request.state.server_timing = timings
+    return timings
@@ -0,0 +1,18 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from fastapi import Request
+
+# Worker processes for HTML parsing and extraction; 0 parses inline on the event loop.
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+def create_parse_pool(workers: int = PARSE_WORKERS) -> Optional[ProcessPoolExecutor]:
+    if workers <= 0:
+        return None
+    # "spawn" so workers never inherit the event loop or the HTTP client's sockets.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+# FastAPI dependency for the application-lifetime pool created at startup
+def get_parse_pool(request: Request) -> Optional[ProcessPoolExecutor]:
+    return request.app.state.parse_pool
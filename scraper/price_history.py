@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import numpy as np
+from fastapi import Request
+from models.pydantic_models import PriceChange, PriceChanges, Product, VendorPriceStats
+
+logger = logging.getLogger(__name__)
+
+# Directory holding one price snapshot file per store; recording is off unless it is set.
+PRICE_HISTORY_DIR = os.getenv("PRICE_HISTORY_DIR", "")
+
+# One row per variant. Snapshots are stored sorted by variant_id, so two of them can
+# be joined with a merge instead of a hash lookup per row. Prices are integer cents,
+# which compare exactly.
+SNAPSHOT_DTYPE = np.dtype([
+    ("product_id", "<i8"),
+    ("variant_id", "<i8"),
+    ("price_cents", "<i8"),
+    ("vendor", "<i4"),
+    ("available", "?"),
+])
+
+def _store_key(store_url: str) -> str:
+    """A file name for a normalized store URL, e.g. https://www.memy.co.in/ -> https_www.memy.co.in."""
+    return re.sub(r"[^A-Za-z0-9.-]+", "_", store_url).strip("_")
+
+class SnapshotWriter:
+    """
+    Collects one scrape's catalog a page at a time as compact rows, and appends it to
+    the store's history on commit(). A scrape that never commits leaves no trace.
+    """
+    def __init__(self, history: "PriceHistory", store_url: str):
+        self.history = history
+        self.store_url = store_url
+        self.taken_at = datetime.now(timezone.utc)
+        self._chunks: List[np.ndarray] = []
+        self._vendors: Dict[str, int] = {}
+
+    def add(self, products: List[Product]) -> None:
+        rows = []
+        for product in products:
+            vendor = self._vendors.setdefault(product.vendor, len(self._vendors))
+            if not product.variants:
+                # Stand-in variant id that can't collide with a real one.
+                rows.append((product.id, -product.id, round(product.price * 100), vendor, True))
+            for variant in product.variants:
+                rows.append((product.id, variant.id, round(variant.price * 100), vendor, variant.available is not False))
+        self._add_rows(rows)
+
+    def add_items(self, items: List[dict]) -> None:
+        """Like add(), for raw /products.json items, so a refresh can record products it never parses."""
+        rows = []
+        for item in items:
+            vendor = self._vendors.setdefault(item['vendor'], len(self._vendors))
+            variants = item.get('variants') or []
+            if not variants:
+                # The scraper prices a product without variants at zero.
+                rows.append((item['id'], -item['id'], 0, vendor, True))
+            for variant in variants:
+                rows.append((item['id'], variant['id'], round(float(variant['price']) * 100), vendor, variant.get('available') is not False))
+        self._add_rows(rows)
+
+    def _add_rows(self, rows: List[tuple]) -> None:
+        if rows:
+            self._chunks.append(np.array(rows, dtype=SNAPSHOT_DTYPE))
+
+    async def commit(self) -> None:
+        rows = np.concatenate(self._chunks) if self._chunks else np.empty(0, dtype=SNAPSHOT_DTYPE)
+        vendors = list(self._vendors)
+        try:
+            await asyncio.to_thread(self.history._append, self.store_url, rows, vendors, self.taken_at)
+        except OSError as e:
+            logger.warning(f"Could not record a price snapshot for {self.store_url}: {e}")
+
+class PriceHistory:
+    """
+    Append-only price snapshots, one per complete catalog scrape. Each store has a
+    <key>.bin file of SNAPSHOT_DTYPE rows, read back through a memory map so a
+    comparison only pages in the two snapshots it touches, and a <key>.json index of
+    snapshot offsets and vendor names.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def writer(self, store_url: str) -> SnapshotWriter:
+        return SnapshotWriter(self, store_url)
+
+    def _paths(self, store_url: str):
+        base = os.path.join(self.directory, _store_key(store_url))
+        return f"{base}.bin", f"{base}.json"
+
+    def _read_index(self, store_url: str) -> Optional[dict]:
+        try:
+            with open(self._paths(store_url)[1]) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _append(self, store_url: str, rows: np.ndarray, vendors: List[str], taken_at: datetime) -> None:
+        data_path, index_path = self._paths(store_url)
+        with self._locks.setdefault(store_url, threading.Lock()):
+            index = self._read_index(store_url) or {"store_url": store_url, "vendors": [], "snapshots": []}
+            codes = {name: code for code, name in enumerate(index["vendors"])}
+            for name in vendors:
+                if name not in codes:
+                    codes[name] = len(index["vendors"])
+                    index["vendors"].append(name)
+            # Sorted by variant_id, keeping the first row of a variant listed twice.
+            _, first = np.unique(rows["variant_id"], return_index=True)
+            rows = rows[first]
+            if len(rows):
+                rows["vendor"] = np.array([codes[name] for name in vendors], dtype="<i4")[rows["vendor"]]
+
+            snapshots = index["snapshots"]
+            if snapshots and snapshots[-1]["rows"] == len(rows) and np.array_equal(self._rows(data_path, snapshots[-1]), rows):
+                # Nothing moved since the last snapshot; just note that it still held.
+                snapshots[-1]["confirmed_at"] = taken_at.isoformat()
+            else:
+                with open(data_path, "ab") as f:
+                    # Offsets come from the file itself, so rows left by a crash before the
+                    # index was written are simply never referenced.
+                    offset = f.tell() // SNAPSHOT_DTYPE.itemsize
+                    f.write(rows.tobytes())
+                snapshots.append({"taken_at": taken_at.isoformat(), "offset": offset, "rows": len(rows)})
+
+            tmp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, index_path)
+
+    def _rows(self, data_path: str, snapshot: dict) -> np.ndarray:
+        if not snapshot["rows"]:
+            return np.empty(0, dtype=SNAPSHOT_DTYPE)
+        rows = np.memmap(data_path, dtype=SNAPSHOT_DTYPE, mode="r", offset=snapshot["offset"] * SNAPSHOT_DTYPE.itemsize, shape=(snapshot["rows"],))
+        # A plain ndarray over the same mapping; memmap's subclass hooks slow down indexing.
+        return rows.view(np.ndarray)
+
+    def find_store(self, store_urls: List[str]) -> Optional[str]:
+        """The first of `store_urls` that has any snapshots."""
+        return next((url for url in store_urls if os.path.exists(self._paths(url)[1])), None)
+
+    def price_changes(self, store_url: str, since: Optional[datetime] = None, limit: int = 100) -> Optional[PriceChanges]:
+        """
+        Compares the latest snapshot with the last one taken at or before `since` (the
+        earliest one if `since` predates them all), or with the one before it when
+        `since` is omitted. None if the store has fewer than two snapshots.
+        """
+        index = self._read_index(store_url)
+        snapshots = index["snapshots"] if index else []
+        if len(snapshots) < 2:
+            return None
+        if since is None:
+            baseline = snapshots[-2]
+        else:
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            earlier = [snapshot for snapshot in snapshots if datetime.fromisoformat(snapshot["taken_at"]) <= since]
+            baseline = earlier[-1] if earlier else snapshots[0]
+        latest = snapshots[-1]
+        data_path = self._paths(store_url)[0]
+        changes = compare_snapshots(self._rows(data_path, baseline), self._rows(data_path, latest), index["vendors"], limit)
+        return PriceChanges(
+            store_url=store_url,
+            from_snapshot=baseline["taken_at"],
+            to_snapshot=latest["taken_at"],
+            snapshots=len(snapshots),
+            **changes,
+        )
+
+def compare_snapshots(old: np.ndarray, new: np.ndarray, vendors: List[str], limit: int) -> dict:
+    """Price deltas, new/removed products and per-vendor price statistics, computed on whole columns."""
+    old_products = np.unique(old["product_id"])
+    new_products = np.unique(new["product_id"])
+    added = np.setdiff1d(new_products, old_products, assume_unique=True)
+    removed = np.setdiff1d(old_products, new_products, assume_unique=True)
+
+    # Both snapshots are sorted by variant_id, so this is a merge join.
+    _, old_idx, new_idx = np.intersect1d(old["variant_id"], new["variant_id"], assume_unique=True, return_indices=True)
+    old_price = old["price_cents"][old_idx]
+    new_price = new["price_cents"][new_idx]
+    delta = new_price - old_price
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = np.where(old_price > 0, delta * 100.0 / old_price, np.nan)
+    moved = np.flatnonzero(delta)
+    # Biggest relative moves first; a move from a zero price ranks by its absolute size.
+    ranking = np.where(np.isnan(change_pct[moved]), np.abs(delta[moved]), np.abs(change_pct[moved]))
+    top = moved[np.argsort(-ranking, kind="stable")[:limit]]
+    old_available = old["available"][old_idx]
+    new_available = new["available"][new_idx]
+
+    return {
+        "variants_compared": len(old_idx),
+        "price_changes_total": len(moved),
+        "price_changes": [
+            PriceChange(
+                product_id=int(new["product_id"][new_idx[i]]),
+                variant_id=int(new["variant_id"][new_idx[i]]),
+                vendor=vendors[new["vendor"][new_idx[i]]],
+                old_price=old_price[i] / 100,
+                new_price=new_price[i] / 100,
+                change=delta[i] / 100,
+                change_pct=None if np.isnan(change_pct[i]) else round(float(change_pct[i]), 2),
+            )
+            for i in top
+        ],
+        "new_products": len(added),
+        "removed_products": len(removed),
+        "new_product_ids": added[:limit].tolist(),
+        "removed_product_ids": removed[:limit].tolist(),
+        "became_available": int(np.count_nonzero(new_available & ~old_available)),
+        "became_unavailable": int(np.count_nonzero(old_available & ~new_available)),
+        "vendors": vendor_stats(new, new_idx, delta, change_pct, vendors),
+    }
+
+def vendor_stats(rows: np.ndarray, matched_idx: np.ndarray, delta: np.ndarray, change_pct: np.ndarray, vendors: List[str]) -> List[VendorPriceStats]:
+    """Per-vendor price statistics of a snapshot, plus the price moves of its matched variants."""
+    if not len(rows):
+        return []
+    codes = rows["vendor"]
+    cents = rows["price_cents"]
+    size = int(codes.max()) + 1
+    counts = np.bincount(codes, minlength=size)
+    means = np.bincount(codes, weights=cents, minlength=size) / np.maximum(counts, 1) / 100
+
+    # Sorting on one (vendor, price) key makes each vendor a contiguous, ordered run;
+    # a single int64 argsort is several times quicker than lexsort on two columns.
+    order = np.argsort((codes.astype(np.int64) << 40) | np.clip(cents, 0, (1 << 40) - 1))
+    sorted_prices = cents[order] / 100
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = np.flatnonzero(counts)
+    first = sorted_prices[starts[present]]
+    last = sorted_prices[starts[present] + counts[present] - 1]
+    lower = sorted_prices[starts[present] + (counts[present] - 1) // 2]
+    upper = sorted_prices[starts[present] + counts[present] // 2]
+
+    moved = delta != 0
+    moved_codes = codes[matched_idx][moved]
+    changed = np.bincount(moved_codes, minlength=size)
+    pct = change_pct[moved]
+    has_pct = ~np.isnan(pct)
+    pct_counts = np.bincount(moved_codes[has_pct], minlength=size)
+    pct_sums = np.bincount(moved_codes[has_pct], weights=pct[has_pct], minlength=size)
+
+    return [
+        VendorPriceStats(
+            vendor=vendors[code],
+            variants=int(counts[code]),
+            mean_price=round(float(means[code]), 2),
+            median_price=round(float((lower[i] + upper[i]) / 2), 2),
+            min_price=float(first[i]),
+            max_price=float(last[i]),
+            price_changes=int(changed[code]),
+            mean_change_pct=round(float(pct_sums[code] / pct_counts[code]), 2) if pct_counts[code] else None,
+        )
+        for i, code in enumerate(present)
+    ]
+
+def create_price_history() -> Optional[PriceHistory]:
+    if not PRICE_HISTORY_DIR:
+        return None
+    return PriceHistory(PRICE_HISTORY_DIR)
+
+# FastAPI dependency for the application-lifetime price history created at startup
+def get_price_history(request: Request) -> Optional[PriceHistory]:
+    return request.app.state.price_history
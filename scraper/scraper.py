@@ -1,49 +1,464 @@
-import requests
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+import httpx
 import re
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-from models.pydantic_models import BrandInsights, Product, SocialHandles, ContactDetails, FAQItem
-from typing import List, Optional
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from datetime import datetime
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from pydantic import HttpUrl, TypeAdapter
+from models.pydantic_models import BrandInsights, Product, ProductVariant, SocialHandles, ContactDetails, FAQItem
+from scraper.cache import CachedResponse, ResponseCache
+from scraper.crawl_state import CatalogRefresh, CrawlState, parse_timestamp, product_hash
+from scraper.extractor import HomepageData, PageContacts, parse_contacts, parse_faqs, parse_homepage
+from scraper.http_client import create_http_client
+from scraper.metrics import PhaseTimings, record_scrape
+from scraper.price_history import PriceHistory
+from scraper.sitemap import SitemapEntry, SitemapParser, product_handle
+from scraper.themes import GENERIC_PLAN, ExtractionPlans, detect_theme, resolve_plan
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Overall wall-clock budget for a single store scrape, shared by every fetch it issues.
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", "30"))
+
+# Shopify caps /products.json at 250 products per page.
+PRODUCTS_PAGE_LIMIT = 250
+# How many /products.json pages may be in flight at once while paging through a catalog.
+CATALOG_PREFETCH_PAGES = int(os.getenv("CATALOG_PREFETCH_PAGES", "8"))
+# How many /products/<handle>.json documents may be in flight at once when the catalog is rebuilt from the sitemap.
+SITEMAP_FETCH_CONCURRENCY = int(os.getenv("SITEMAP_FETCH_CONCURRENCY", "8"))
+# /products.json statuses meaning the store has turned the endpoint off, so the sitemap is read instead.
+PRODUCTS_JSON_DISABLED_STATUSES = frozenset({401, 403, 404})
+
+# The pages each BrandInsights section is built from, so a scrape only fetches what its fields need.
+SECTION_SOURCES = {
+    "brand_context": frozenset({"homepage"}),
+    "product_catalog": frozenset({"catalog"}),
+    "hero_products": frozenset({"homepage", "hero_pages"}),
+    "social_handles": frozenset({"homepage"}),
+    "contact_details": frozenset({"homepage", "contact_page"}),
+    "privacy_policy_url": frozenset({"homepage"}),
+    "refund_policy_url": frozenset({"homepage"}),
+    "faqs": frozenset({"homepage", "faq_page"}),
+    "important_links": frozenset({"homepage"}),
+}
+
+# Validates a whole /products.json page in one call instead of one Product(...) per item.
+_PRODUCT_LIST = TypeAdapter(List[Product])
+# Parsed products and variants always have every field set, so they can all share one
+# fields-set instead of each carrying its own; re-adding a name already in it never mutates it.
+_PRODUCT_FIELDS_SET = set(Product.model_fields)
+_VARIANT_FIELDS_SET = set(ProductVariant.model_fields)
+
+async def _skipped():
+    """Stands in for a fetch the requested fields don't need."""
+    return None
+
+def normalize_store_url(url: str) -> str:
+    """The canonical form of a store URL, as stored in BrandInsights.store_url and the brands table."""
+    return str(HttpUrl(url.rstrip('/')))
+
+@dataclass
+class ScrapeProgress:
+    pages_fetched: int = 0
+    products_parsed: int = 0
+    bytes_fetched: int = 0
+    cache_hits: int = 0
 
 class ShopifyScraper:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, client: Optional[httpx.AsyncClient] = None, cache: Optional[ResponseCache] = None, parse_pool: Optional[Executor] = None, timeout: float = SCRAPE_TIMEOUT, catalog_prefetch: int = CATALOG_PREFETCH_PAGES, fields: Optional[Iterable[str]] = None, sitemap_concurrency: int = SITEMAP_FETCH_CONCURRENCY, price_history: Optional[PriceHistory] = None, extraction_plans: Optional[ExtractionPlans] = None):
+        """
+        Pass the application's shared `client` to reuse its warm connections; without
+        one, each run()/stream() opens and closes a client of its own. With a `cache`,
+        pages are served from it while fresh and revalidated once stale. With a
+        `parse_pool`, HTML parsing and extraction run there instead of on the event loop.
+        `fields` limits the scrape to those BrandInsights sections (all of them by
+        default); pages no requested section needs are never fetched. With a
+        `price_history`, every complete catalog read is recorded as a price snapshot.
+        With `extraction_plans`, the FAQ layout found for the store's theme is remembered
+        for later scrapes.
+        """
+        self.fields = frozenset(fields) if fields else frozenset(SECTION_SOURCES)
+        unknown = self.fields - SECTION_SOURCES.keys()
+        if unknown:
+            raise ValueError(f"Unknown insight fields: {', '.join(sorted(unknown))}")
+        self.sources = frozenset().union(*(SECTION_SOURCES[name] for name in self.fields))
         self.base_url = base_url.rstrip('/')
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        })
+        self.timeout = timeout
+        self.catalog_prefetch = max(1, catalog_prefetch)
+        self.sitemap_concurrency = max(1, sitemap_concurrency)
+        self.shared_client = client
+        self.cache = cache
+        # Set by refresh(): a cached page is always revalidated with the store, however fresh.
+        self.revalidate = False
+        self.parse_pool = parse_pool
+        self.price_history = price_history
+        self.extraction_plans = extraction_plans
+        # The selectors for the store's theme, chosen once the homepage is in.
+        self.plan = GENERIC_PLAN
+        self.client: Optional[httpx.AsyncClient] = None
+        self.progress = ScrapeProgress()
+        # Where the scrape spent its time, for Server-Timing and /metrics.
+        self.timings = PhaseTimings()
+        # Cleared when catalog paging stops early on an error.
+        self.catalog_complete = True
+        # "products_json", or "sitemap" once the catalog had to be rebuilt from the sitemap.
+        self.catalog_source = "products_json"
+        # Sitemap products skipped because their lastmod wasn't past the refresh watermark.
+        self.sitemap_unmodified = 0
+        # SECTION_SOURCES pages that failed to load, making the sections built from them incomplete.
+        self.failed_sources = set()
+        # One copy of each vendor/product_type string per catalog instead of one per product.
+        self._strings: dict = {}
+        # Homepage product handles in page order, and the products found for them so far.
+        self.hero_handles: List[str] = []
+        self.heroes_by_handle: Dict[str, Product] = {}
+        self._wanted_handles = set()
 
-    def _get_soup(self, url: str) -> Optional[BeautifulSoup]:
-        try:
-            response = self.session.get(url, timeout=10)
+    async def _fetch(self, url: str, params: Optional[dict] = None, timeout: float = 10) -> bytes:
+        """GETs a page body, going through the response cache when one is configured."""
+        if self.cache is None:
+            with self.timings.phase("fetch"):
+                response = await self.client.get(url, params=params, timeout=timeout)
             response.raise_for_status()
-            return BeautifulSoup(response.content, 'html.parser')
-        except requests.RequestException:
+            self.progress.bytes_fetched += len(response.content)
+            return response.content
+
+        key = str(httpx.URL(url, params=params))
+        entry = await self.cache.get(key)
+        if entry is not None and not self.revalidate and entry.is_fresh(self.cache.ttl):
+            self.progress.cache_hits += 1
+            return entry.content
+
+        with self.timings.phase("fetch"):
+            response = await self.client.get(key, headers=entry.validators() if entry else None, timeout=timeout)
+        if response.status_code == 304 and entry is not None:
+            self.progress.cache_hits += 1
+            entry.stored_at = time.time()
+            await self.cache.set(key, entry)
+            return entry.content
+        response.raise_for_status()
+        self.progress.bytes_fetched += len(response.content)
+        await self.cache.set(key, CachedResponse(
+            content=response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            stored_at=time.time(),
+        ))
+        return response.content
+
+    async def _get_page(self, url: str) -> Optional[bytes]:
+        try:
+            content = await self._fetch(url, timeout=10)
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to fetch {url}: {e!r}")
             return None
+        self.progress.pages_fetched += 1
+        return content
 
-    def fetch_product_catalog(self) -> List[Product]:
-        products_url = f"{self.base_url}/products.json"
-        products_list = []
+    async def _parse(self, parser: Callable, *args):
+        """Runs a scraper.extractor parse_* function in the parse pool, or inline without one."""
+        with self.timings.phase("extract"):
+            if self.parse_pool is None:
+                return parser(*args)
+            return await asyncio.get_running_loop().run_in_executor(self.parse_pool, parser, *args)
+
+    def _product_fields(self, item: dict) -> dict:
+        variants = item.get('variants') or []
+        return {
+            "id": item['id'],
+            "title": item['title'],
+            "vendor": self._strings.setdefault(item['vendor'], item['vendor']),
+            "product_type": self._strings.setdefault(item['product_type'], item['product_type']),
+            "price": variants[0].get('price', 0.0) if variants else 0.0,
+            "url": f"{self.base_url}/products/{item['handle']}",
+            "updated_at": item.get('updated_at'),
+            "variants": variants,
+        }
+
+    def _parse_products(self, items: List[dict]) -> List[Product]:
+        """Validates raw /products.json items into Product models in a single batch."""
+        products = _PRODUCT_LIST.validate_python([self._product_fields(item) for item in items])
+        for item, product in zip(items, products):
+            object.__setattr__(product, '__pydantic_fields_set__', _PRODUCT_FIELDS_SET)
+            for variant in product.variants:
+                object.__setattr__(variant, '__pydantic_fields_set__', _VARIANT_FIELDS_SET)
+            # Only hero handles are indexed, so streaming a catalog never holds on to it.
+            if item['handle'] in self._wanted_handles:
+                self.heroes_by_handle[item['handle']] = product
+        return products
+
+    def _want_hero_products(self, homepage_handles: List[str]) -> None:
+        """Registers the homepage's product handles so catalog parsing indexes their products."""
+        handles = (handle.split('#')[0].strip('/') for handle in homepage_handles)
+        self.hero_handles = list(dict.fromkeys(handle for handle in handles if handle))
+        self._wanted_handles = set(self.hero_handles)
+
+    async def _fetch_product_json(self, handle: str) -> Optional[dict]:
+        """The raw /products/<handle>.json item, or None when the store has no such product."""
+        try:
+            content = await self._fetch(f"{self.base_url}/products/{handle}.json", timeout=10)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+        self.progress.pages_fetched += 1
+        with self.timings.phase("decode"):
+            return json.loads(content).get('product') or None
+
+    async def _fetch_product_by_handle(self, handle: str) -> None:
+        """Fetches one product from /products/<handle>.json into the hero index."""
+        try:
+            # None is a stale homepage link rather than a failure.
+            item = await self._fetch_product_json(handle)
+            if item:
+                with self.timings.phase("validate"):
+                    self.heroes_by_handle[handle] = self._parse_products([item])[0]
+        except (httpx.HTTPError, ValueError) as e:
+            self.failed_sources.add("hero_pages")
+            logger.warning(f"Failed to fetch hero product {handle} of {self.base_url}: {e!r}")
+
+    async def _resolve_hero_products(self) -> List[Product]:
+        """
+        The homepage's products in homepage order. Handles the catalog pages didn't cover
+        are fetched one by one, unless the whole catalog was read and they simply aren't in it.
+        """
+        if not ("catalog" in self.sources and self.catalog_complete):
+            missing = [handle for handle in self.hero_handles if handle not in self.heroes_by_handle]
+            await asyncio.gather(*(self._fetch_product_by_handle(handle) for handle in missing))
+        heroes = {}
+        for handle in self.hero_handles:
+            product = self.heroes_by_handle.get(handle)
+            if product is not None:
+                heroes.setdefault(product.id, product)
+        return list(heroes.values())
+
+    async def _fetch_products_page(self, params: dict) -> List[dict]:
+        content = await self._fetch(f"{self.base_url}/products.json", params={"limit": PRODUCTS_PAGE_LIMIT, **params}, timeout=15)
+        self.progress.pages_fetched += 1
+        with self.timings.phase("decode"):
+            return json.loads(content).get('products', [])
+
+    async def _iter_raw_product_pages(self, modified_since: Optional[datetime] = None) -> AsyncIterator[List[dict]]:
+        """
+        Raw catalog pages from /products.json. Stores that disable it (401, 403 or 404)
+        or serve it empty get their catalog rebuilt from the sitemap instead; there,
+        `modified_since` skips products whose lastmod is older. Any other error status,
+        such as a 5xx still failing after retries, is raised, so the catalog is reported
+        degraded rather than rebuilt with one request per product.
+        """
+        pages = self._iter_products_json_pages()
+        products_json_error = None
+        try:
+            try:
+                first_page = await pages.__anext__()
+            except StopAsyncIteration:
+                first_page = None
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in PRODUCTS_JSON_DISABLED_STATUSES:
+                    raise
+                products_json_error = e
+                first_page = None
+
+            if first_page is not None:
+                yield first_page
+                async for page in pages:
+                    yield page
+                return
+        finally:
+            await pages.aclose()
+
+        logger.info(f"{self.base_url}/products.json returned no products, discovering the catalog through the sitemap")
+        self.catalog_source = "sitemap"
+        try:
+            async for page in self._iter_sitemap_product_pages(modified_since):
+                yield page
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404 or e.request.url.path != urlsplit(f"{self.base_url}/sitemap.xml").path:
+                raise
+            # No sitemap either: report whatever /products.json said.
+            if products_json_error is not None:
+                raise products_json_error
+
+    async def _read_sitemap(self, url: str) -> List[SitemapEntry]:
+        """
+        The entries of one sitemap document, parsed as it downloads. The response is
+        closed before any entry is used: while open it holds one of the host's request
+        slots, and product fetches queued behind it on a throttled host would never run.
+        """
+        parser = SitemapParser()
+        entries = []
+        with self.timings.phase("fetch"):
+            response = await self.client.send(self.client.build_request("GET", url, timeout=15), stream=True)
         try:
-            response = self.session.get(f"{products_url}?limit=250", timeout=15)
             response.raise_for_status()
-            products_data = response.json().get('products', [])
-            
-            for item in products_data:
-                price = float(item.get('variants', [{}])[0].get('price', 0.0))
-                product = Product(
-                    id=item['id'],
-                    title=item['title'],
-                    vendor=item['vendor'],
-                    product_type=item['product_type'],
-                    price=price,
-                    url=f"{self.base_url}/products/{item['handle']}"
-                )
-                products_list.append(product)
-        except (requests.RequestException, ValueError):
-            pass
+            self.progress.pages_fetched += 1
+            async for chunk in response.aiter_bytes():
+                self.progress.bytes_fetched += len(chunk)
+                with self.timings.phase("decode"):
+                    entries.extend(parser.feed(chunk))
+        finally:
+            await response.aclose()
+        with self.timings.phase("decode"):
+            entries.extend(parser.close())
+        return entries
+
+    def _store_url(self, url: str) -> str:
+        """`url` moved onto this store's host; sitemaps often point at the store's primary domain."""
+        base, parts = urlsplit(self.base_url), urlsplit(url)
+        return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, ''))
+
+    async def _iter_sitemap_products(self) -> AsyncIterator[SitemapEntry]:
+        """The product <url> entries of /sitemap.xml, following its sitemap_products_* children."""
+        children = []
+        for entry in await self._read_sitemap(f"{self.base_url}/sitemap.xml"):
+            if entry.is_index:
+                if "sitemap_products" in urlsplit(entry.loc).path:
+                    children.append(self._store_url(entry.loc))
+            elif product_handle(entry.loc):
+                yield entry
+        for child in children:
+            for entry in await self._read_sitemap(child):
+                if not entry.is_index and product_handle(entry.loc):
+                    yield entry
+
+    async def _iter_sitemap_product_pages(self, modified_since: Optional[datetime] = None) -> AsyncIterator[List[dict]]:
+        """
+        Rebuilds the catalog from the sitemap: product handles are streamed out of the
+        sitemaps while their /products/<handle>.json documents are fetched
+        `sitemap_concurrency` at a time, and yielded in pages of PRODUCTS_PAGE_LIMIT.
+        """
+        seen_handles = set()
+        pending = deque()
+        page = []
+        try:
+            async for entry in self._iter_sitemap_products():
+                handle = product_handle(entry.loc)
+                if handle in seen_handles:
+                    continue
+                seen_handles.add(handle)
+                lastmod = parse_timestamp(entry.lastmod)
+                if modified_since and lastmod and lastmod <= modified_since:
+                    self.sitemap_unmodified += 1
+                    continue
+                pending.append(asyncio.ensure_future(self._fetch_product_json(handle)))
+                if len(pending) >= self.sitemap_concurrency:
+                    item = await pending.popleft()
+                    if item:
+                        page.append(item)
+                    if len(page) >= PRODUCTS_PAGE_LIMIT:
+                        yield page
+                        page = []
+            while pending:
+                item = await pending.popleft()
+                if item:
+                    page.append(item)
+            if page:
+                yield page
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _iter_products_json_pages(self) -> AsyncIterator[List[dict]]:
+        """
+        Pages through /products.json, keeping up to `catalog_prefetch` pages in flight.
+        The window starts at one page and doubles after every full page, so small
+        catalogs cost a single request. Stops at the first empty or short page.
+        Stores that ignore `page` (they keep serving products we've already seen)
+        are re-read with a serial `since_id` cursor.
+        """
+        seen_ids = set()
+        pending = deque()
+        next_page = 1
+        window = 1
+        exhausted = False
+        try:
+            while True:
+                while len(pending) < window:
+                    pending.append(asyncio.ensure_future(self._fetch_products_page({"page": next_page})))
+                    next_page += 1
+                products = await pending.popleft()
+                if not products:
+                    exhausted = True
+                    return
+                fresh = [item for item in products if item['id'] not in seen_ids]
+                if not fresh:
+                    exhausted = True
+                    break
+                seen_ids.update(item['id'] for item in fresh)
+                yield fresh
+                if len(products) < PRODUCTS_PAGE_LIMIT:
+                    exhausted = True
+                    return
+                window = min(window * 2, self.catalog_prefetch)
+        finally:
+            # Let pages already requested past the end finish: cancelling an in-flight
+            # request would throw away its pooled keep-alive connection.
+            if not exhausted:
+                for task in pending:
+                    task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        logger.info(f"{self.base_url} ignores ?page=, falling back to since_id pagination")
+        since_id = 0
+        while True:
+            products = await self._fetch_products_page({"since_id": since_id})
+            if not products:
+                return
+            last_id = max(item['id'] for item in products)
+            if last_id <= since_id:
+                # The store doesn't honour since_id either; nothing more to discover.
+                return
+            since_id = last_id
+            fresh = [item for item in products if item['id'] not in seen_ids]
+            seen_ids.update(item['id'] for item in fresh)
+            if fresh:
+                yield fresh
+            if len(products) < PRODUCTS_PAGE_LIMIT:
+                return
+
+    async def iter_product_pages(self) -> AsyncIterator[List[Product]]:
+        """Yields the catalog one /products.json page at a time, ending early if a page fails."""
+        pages = self._iter_raw_product_pages()
+        snapshot = self.price_history.writer(normalize_store_url(self.base_url)) if self.price_history is not None else None
+        try:
+            async for page in pages:
+                with self.timings.phase("validate"):
+                    products = self._parse_products(page)
+                self.progress.products_parsed += len(products)
+                if snapshot is not None:
+                    snapshot.add(products)
+                yield products
+            if snapshot is not None:
+                await snapshot.commit()
+        except (httpx.HTTPError, ValueError) as e:
+            self.catalog_complete = False
+            self.failed_sources.add("catalog")
+            logger.warning(f"Stopped paging the catalog of {self.base_url}: {e!r}")
+        finally:
+            await pages.aclose()
+
+    async def fetch_product_catalog(self) -> List[Product]:
+        products_list = []
+        async for page in self.iter_product_pages():
+            products_list.extend(page)
         return products_list
 
+    async def _fetch_catalog_and_heroes(self):
+        """The catalog and hero products the fields ask for; heroes are resolved once the catalog has been read."""
+        catalog = await self.fetch_product_catalog() if "catalog" in self.sources else None
+        heroes = await self._resolve_hero_products() if "hero_products" in self.fields else None
+        return catalog, heroes
+
     def find_important_links(self, soup: BeautifulSoup) -> dict:
         # CORRECTED: Added "faqs" to the initial dictionary
         links = {"contact_us": None, "privacy_policy": None, "refund_policy": None, "blogs": None, "track_order": None, "faqs": None}
@@ -89,262 +504,283 @@ class ShopifyScraper:
         phones = list(set(re.findall(r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}', text)))
         return ContactDetails(emails=emails, phone_numbers=phones)
     
-    def extract_hero_products(self, soup: BeautifulSoup, full_catalog: List[Product]) -> List[Product]:
-        hero_products = []
+    def _homepage_product_handles(self, soup: BeautifulSoup) -> set:
         product_handles = set()
         for a_tag in soup.select('a[href*="/products/"]'):
             href = a_tag.get('href')
             if href and "/products/" in href:
                 handle = href.split('/products/')[-1].split('?')[0]
                 product_handles.add(handle)
+        return product_handles
 
-        for product in full_catalog:
-            product_url = str(product.url)
-            for handle in product_handles:
-                if product_url.endswith(handle):
-                    hero_products.append(product)
-                    break
-        return hero_products
-    
     def extract_brand_context(self, soup: BeautifulSoup) -> Optional[str]:
         """Extracts brand context from the meta description tag."""
         brand_description = soup.find('meta', attrs={'name': 'description'})
         return brand_description['content'] if brand_description else None
 
-    def extract_faqs(self, faq_page_url: Optional[str]) -> List[FAQItem]:
+    async def extract_faqs(self, faq_page_url: Optional[str]) -> List[FAQItem]:
         if not faq_page_url:
             return []
-        faq_soup = self._get_soup(faq_page_url)
-        if not faq_soup:
+        content = await self._get_page(faq_page_url)
+        if content is None:
+            self.failed_sources.add("faq_page")
+        if not content:
             return []
-        faq_list = []
-        for item in faq_soup.select('details.accordion__item'):
-            question_tag = item.find('summary')
-            answer_tag = item.find('div', class_='accordion__content')
-            if question_tag and answer_tag:
-                question = question_tag.get_text(strip=True)
-                answer = answer_tag.get_text(strip=True, separator='\n')
-                faq_list.append(FAQItem(question=question, answer=answer))
-        return faq_list
-
-    def run(self) -> BrandInsights:
-        homepage_soup = self._get_soup(self.base_url)
-        if not homepage_soup:
+        page = await self._parse(parse_faqs, content, self.plan)
+        if self.extraction_plans is not None:
+            self.extraction_plans.learn(self.base_url, self.plan, page.layout)
+        return [FAQItem(question=question, answer=answer) for question, answer in page.items]
+
+    async def _fetch_contact_page_details(self, contact_url: Optional[str], homepage: HomepageData) -> PageContacts:
+        """The contact page falls back to the homepage when no dedicated link exists."""
+        if not contact_url:
+            return homepage.contacts
+        content = await self._get_page(contact_url)
+        if content is None:
+            self.failed_sources.add("contact_page")
+        return await self._parse(parse_contacts, content) if content else PageContacts()
+
+    async def _fetch_homepage(self) -> HomepageData:
+        content = await self._get_page(self.base_url)
+        if not content:
             raise ValueError("Could not fetch the website's homepage.")
-            
-        links = self.find_important_links(homepage_soup)
-        contact_soup = self._get_soup(links.get('contact_us')) if links.get('contact_us') else homepage_soup
-        
-        contacts_home = self.extract_contact_details(homepage_soup)
-        contacts_page = self.extract_contact_details(contact_soup) if contact_soup else ContactDetails()
-        
+        theme = detect_theme(content)
+        self.plan = self.extraction_plans.plan(self.base_url, theme) if self.extraction_plans is not None else resolve_plan(theme)
+        return await self._parse(parse_homepage, content, self.base_url, self.plan)
+
+    def degraded_sections(self) -> List[str]:
+        """The requested sections built from a page that failed to load."""
+        return [name for name, sources in SECTION_SOURCES.items() if name in self.fields and sources & self.failed_sources]
+
+    def _merge_contact_details(self, homepage: HomepageData, contacts_page: PageContacts) -> ContactDetails:
+        contacts_home = homepage.contacts
         all_emails = list(set(contacts_home.emails + contacts_page.emails))
         all_phones = list(set(contacts_home.phone_numbers + contacts_page.phone_numbers))
+        return ContactDetails(emails=all_emails, phone_numbers=all_phones)
+
+    async def _scrape(self) -> BrandInsights:
+        homepage = await self._fetch_homepage() if "homepage" in self.sources else None
+        links = homepage.links if homepage else {}
+        if "hero_products" in self.fields:
+            self._want_hero_products(homepage.hero_handles if homepage else [])
 
-        # CORRECTED: Fetch catalog only once for efficiency
-        full_product_catalog = self.fetch_product_catalog()
+        # Everything below only depends on the homepage links, so fetch it concurrently.
+        contacts_page, (full_product_catalog, hero_products), faqs = await asyncio.gather(
+            self._fetch_contact_page_details(links.get('contact_us'), homepage) if "contact_page" in self.sources else _skipped(),
+            self._fetch_catalog_and_heroes(),
+            self.extract_faqs(links.get("faqs")) if "faq_page" in self.sources else _skipped(),
+        )
+        if homepage is None and not full_product_catalog and not self.catalog_complete:
+            # Without the homepage, a catalog that failed outright is our only sign the store is unreachable.
+            raise ValueError("Could not fetch the store's product catalog.")
+
+        sections = {}
+        if homepage is not None:
+            sections.update(
+                brand_context=homepage.brand_context,
+                social_handles=SocialHandles(**homepage.social_handles),
+                privacy_policy_url=links.get('privacy_policy'),
+                refund_policy_url=links.get('refund_policy'),
+                important_links=links,
+            )
+        if full_product_catalog is not None:
+            sections["product_catalog"] = full_product_catalog
+        if hero_products is not None:
+            sections["hero_products"] = hero_products
+        if contacts_page is not None:
+            sections["contact_details"] = self._merge_contact_details(homepage, contacts_page)
+        if faqs is not None:
+            sections["faqs"] = faqs
 
         insights = BrandInsights(
             store_url=self.base_url,
-            product_catalog=full_product_catalog,
-            hero_products=self.extract_hero_products(homepage_soup, full_product_catalog),
-            brand_context=self.extract_brand_context(homepage_soup),
-            social_handles=self.extract_social_handles(homepage_soup),
-            contact_details=ContactDetails(emails=all_emails, phone_numbers=all_phones),
-            privacy_policy_url=links.get('privacy_policy'),
-            refund_policy_url=links.get('refund_policy'),
-            faqs=self.extract_faqs(links.get("faqs")),
-            important_links=links
+            degraded_sections=self.degraded_sections(),
+            **{name: value for name, value in sections.items() if name in self.fields}
         )
         return insights
-    
 
-    
-# import requests
-# import re
-# from bs4 import BeautifulSoup
-# from urllib.parse import urljoin
-# from models.pydantic_models import BrandInsights, Product, SocialHandles, ContactDetails, FAQItem
-# from typing import List, Optional
-
-
-# class ShopifyScraper:
-#     def __init__(self, base_url: str):
-#         self.base_url = base_url.rstrip('/')
-#         self.session = requests.Session()
-#         self.session.headers.update({
-#             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-#         })
-
-#     def _get_soup(self, url: str) -> Optional[BeautifulSoup]:
-#         try:
-#             response = self.session.get(url, timeout=10)
-#             response.raise_for_status()
-#             return BeautifulSoup(response.content, 'html.parser')
-#         except requests.RequestException:
-#             return None
-
-#     def fetch_product_catalog(self) -> List[Product]:
-#         """Fetches all products from the /products.json endpoint."""
-#         products_url = f"{self.base_url}/products.json"
-#         products_list = []
-#         try:
-#             response = self.session.get(f"{products_url}?limit=250", timeout=15)
-#             response.raise_for_status()
-#             products_data = response.json().get('products', [])
-            
-#             for item in products_data:
-#                 # Assuming the first variant has the representative price
-#                 price = float(item.get('variants', [{}])[0].get('price', 0.0))
-#                 product = Product(
-#                     id=item['id'],
-#                     title=item['title'],
-#                     vendor=item['vendor'],
-#                     product_type=item['product_type'],
-#                     price=price,
-#                     url=f"{self.base_url}/products/{item['handle']}"
-#                 )
-#                 products_list.append(product)
-#         except (requests.RequestException, ValueError):
-#             # Fallback or log error if .json endpoint fails
-#             pass
-#         return products_list
-
-#     def find_important_links(self, soup: BeautifulSoup) -> dict:
-#         """Finds key pages like policies, contact, etc."""
-#         links = {"contact_us": None, "privacy_policy": None, "refund_policy": None, "blogs": None, "track_order": None}
-#         keywords = {
-#             "contact": "contact_us",
-#             "privacy": "privacy_policy",
-#             "refund": "refund_policy",
-#             "return": "refund_policy", # Alias for refund
-#             "blog": "blogs",
-#             "track": "track_order",
-#             "faq": "faqs", # Add this line
-#             "frequently asked questions": "faqs" # And this for good measure
-#         }
-        
-#         for a_tag in soup.find_all('a', href=True):
-#             link_text = a_tag.get_text(strip=True).lower()
-#             href = a_tag['href']
-            
-#             for keyword, key in keywords.items():
-#                 if keyword in link_text or keyword in href:
-#                     if not links[key]: # Assign only if not already found
-#                         links[key] = urljoin(self.base_url, href)
-#         return links
-    
-#     def extract_social_handles(self, soup: BeautifulSoup) -> SocialHandles:
-#         """Extracts social media links from the page."""
-#         handles = {}
-#         social_patterns = {
-#             'instagram': r'instagram\.com/([a-zA-Z0-9_\.]+)',
-#             'facebook': r'facebook\.com/([a-zA-Z0-9_\.]+)',
-#             'twitter': r'twitter\.com/([a-zA-Z0-9_]+)',
-#             'tiktok': r'tiktok\.com/@([a-zA-Z0-9_\.]+)',
-#             'youtube': r'youtube\.com/(user/|channel/|c/)?([a-zA-Z0-9_\-]+)',
-#         }
-#         for a_tag in soup.find_all("a", href=True):
-#             for platform, pattern in social_patterns.items():
-#                 if platform not in handles and re.search(pattern, a_tag['href']):
-#                     handles[platform] = a_tag['href']
-#         return SocialHandles(**handles)
-
-#     def extract_contact_details(self, soup: BeautifulSoup) -> ContactDetails:
-#         """Extracts emails and phone numbers from text."""
-#         text = soup.get_text()
-#         emails = list(set(re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)))
-#         # Simple regex for phone numbers, can be improved for different formats
-#         phones = list(set(re.findall(r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}', text)))
-#         return ContactDetails(emails=emails, phone_numbers=phones)
-    
-#     def extract_hero_products(self, soup: BeautifulSoup, full_catalog: List[Product]) -> List[Product]:
-#         """
-#         Finds product links on the homepage and matches them with the full product catalog.
-#         """
-#         hero_products = []
-#         product_handles = set() # Use a set to avoid duplicates
-
-#         # Inspect the homepage HTML (e.g., memy.co.in) to find the right tags and classes.
-#         # This selector might need to be adjusted for different sites, but it's a good start.
-#         for a_tag in soup.select('a[href*="/products/"]'):
-#             href = a_tag.get('href')
-#             if href and "/products/" in href:
-#                 # Extract the product "handle" from the URL
-#                 # e.g., "/products/my-cool-product" -> "my-cool-product"
-#                 handle = href.split('/products/')[-1].split('?')[0]
-#                 product_handles.add(handle)
-
-#         # Now, find these products in the full catalog you already fetched
-#         for product in full_catalog:
-#             product_url = str(product.url)
-#             for handle in product_handles:
-#                 if product_url.endswith(handle):
-#                     hero_products.append(product)
-#                     break # Move to the next product in the catalog
-        
-#         return hero_products
-    
-#     def extract_brand_context(self, soup: BeautifulSoup) -> str:
-#         """Extracts brand context or description from the homepage."""
-#         # This is a placeholder; actual implementation will depend on the site's structure.
-#         # You might look for specific sections or meta tags that describe the brand.
-#         brand_description = soup.find('meta', attrs={'name': 'description'})
-#         return brand_description['content'] if brand_description else "No brand context found." 
-#         # Placeholder for FAQs extraction
-#     def extract_faqs(self, faq_page_url: Optional[str]) -> List[FAQItem]:
-#         if not faq_page_url:
-#             return []
-
-#         faq_soup = self._get_soup(faq_page_url)
-#         if not faq_soup:
-#             return []
-
-#         faq_list = []
-#         # Target each <details> tag which acts as a container for a Q&A pair
-#         for item in faq_soup.select('details.accordion__item'):
-#             question_tag = item.find('summary')
-#             answer_tag = item.find('div', class_='accordion__content')
-
-#             if question_tag and answer_tag:
-#                 question = question_tag.get_text(strip=True)
-#                 answer = answer_tag.get_text(strip=True, separator='\n')
-                
-#                 faq_list.append(FAQItem(question=question, answer=answer))
-        
-#         return faq_list
+    async def _stream_records(self) -> AsyncIterator[dict]:
+        homepage = await self._fetch_homepage() if "homepage" in self.sources else None
+        links = homepage.links if homepage else {}
+        if "hero_products" in self.fields:
+            self._want_hero_products(homepage.hero_handles if homepage else [])
+        store = {"store_url": self.base_url}
+        if "brand_context" in self.fields:
+            store["brand_context"] = homepage.brand_context
+        yield {"type": "store", "data": store}
+        link_sections = {
+            "important_links": links,
+            "privacy_policy_url": links.get('privacy_policy'),
+            "refund_policy_url": links.get('refund_policy'),
+        }
+        if self.fields & link_sections.keys():
+            yield {"type": "links", "data": {name: value for name, value in link_sections.items() if name in self.fields}}
+        if "social_handles" in self.fields:
+            yield {"type": "social_handles", "data": SocialHandles(**homepage.social_handles).model_dump(mode="json")}
 
-#     # ... Other methods for hero products, FAQs, brand context ...
+        # The contact and FAQ pages load in the background while the catalog streams out.
+        sections = asyncio.ensure_future(asyncio.gather(
+            self._fetch_contact_page_details(links.get('contact_us'), homepage) if "contact_page" in self.sources else _skipped(),
+            self.extract_faqs(links.get("faqs")) if "faq_page" in self.sources else _skipped(),
+        ))
+        try:
+            product_count = 0
+            hero_ids = set()
+            if "catalog" in self.sources:
+                async for page in self.iter_product_pages():
+                    hero_ids.update(product.id for product in self.heroes_by_handle.values())
+                    for product in page:
+                        yield {"type": "product", "hero": product.id in hero_ids, "data": product.model_dump(mode="json")}
+                    product_count += len(page)
+            if "hero_products" in self.fields:
+                # Heroes the catalog didn't cover, or all of them when no catalog was requested.
+                for product in await self._resolve_hero_products():
+                    if product.id not in hero_ids:
+                        yield {"type": "product", "hero": True, "data": product.model_dump(mode="json")}
+                        product_count += 1
 
-#     def run(self) -> BrandInsights:
-#         """Orchestrates the scraping process."""
-#         homepage_soup = self._get_soup(self.base_url)
-#         if not homepage_soup:
-#             raise ValueError("Could not fetch the website's homepage.")
-            
-#         links = self.find_important_links(homepage_soup)
-#         contact_soup = self._get_soup(links.get('contact_us')) if links.get('contact_us') else homepage_soup
-        
-#         # Combine contacts from homepage and contact page
-#         contacts_home = self.extract_contact_details(homepage_soup)
-#         contacts_page = self.extract_contact_details(contact_soup) if contact_soup else ContactDetails()
-        
-#         all_emails = list(set(contacts_home.emails + contacts_page.emails))
-#         all_phones = list(set(contacts_home.phone_numbers + contacts_page.phone_numbers))
-
-#         insights = BrandInsights(
-#             store_url=self.base_url,
-#             product_catalog=self.fetch_product_catalog(),
-#             social_handles=self.extract_social_handles(homepage_soup),
-#             contact_details=ContactDetails(emails=all_emails, phone_numbers=all_phones),
-#             privacy_policy_url=links.get('privacy_policy'),
-#             refund_policy_url=links.get('refund_policy'),
-#             important_links=links,
-#             # Assuming you have methods to extract hero products, brand context, and FAQs
-#             hero_products=self.extract_hero_products(homepage_soup, self.fetch_product_catalog()),
-#             brand_context=self.extract_brand_context(homepage_soup),
-#             faqs=self.extract_faqs(links.get("faqs")),
-#             # Add other data points as needed
-            
-#         )
-#         return insights
\ No newline at end of file
+            contacts_page, faqs = await sections
+        finally:
+            sections.cancel()
+
+        if contacts_page is not None:
+            yield {"type": "contact_details", "data": self._merge_contact_details(homepage, contacts_page).model_dump(mode="json")}
+        if faqs is not None:
+            yield {"type": "faqs", "data": [faq.model_dump(mode="json") for faq in faqs]}
+        yield {"type": "end", "data": {"product_count": product_count, "degraded_sections": self.degraded_sections()}}
+
+    async def _refresh_catalog(self, state: CrawlState) -> CatalogRefresh:
+        refresh = CatalogRefresh(watermark=state.watermark)
+        watermark = parse_timestamp(state.watermark)
+        newest = watermark
+        pages = self._iter_raw_product_pages(modified_since=watermark)
+        snapshot = self.price_history.writer(normalize_store_url(self.base_url)) if self.price_history is not None else None
+        try:
+            async for page in pages:
+                if snapshot is not None:
+                    snapshot.add_items(page)
+                changed_items = []
+                for item in page:
+                    product_id = item['id']
+                    previous_hash = state.hashes.get(product_id)
+                    updated_at = parse_timestamp(item.get('updated_at'))
+                    if updated_at and (newest is None or updated_at > newest):
+                        newest = updated_at
+                        refresh.watermark = item['updated_at']
+                    if previous_hash is not None and watermark and updated_at and updated_at <= watermark:
+                        # Untouched since the last crawl: skip hashing and parsing altogether.
+                        refresh.hashes[product_id] = previous_hash
+                        refresh.unchanged += 1
+                        continue
+                    content_hash = product_hash(item)
+                    refresh.hashes[product_id] = content_hash
+                    if content_hash == previous_hash:
+                        refresh.unchanged += 1
+                    else:
+                        changed_items.append(item)
+                with self.timings.phase("validate"):
+                    refresh.changed.extend(self._parse_products(changed_items))
+                self.progress.products_parsed += len(changed_items)
+        except (httpx.HTTPError, ValueError) as e:
+            refresh.complete = False
+            logger.warning(f"Stopped paging the catalog of {self.base_url}: {e}")
+        finally:
+            await pages.aclose()
+
+        refresh.unchanged += self.sitemap_unmodified
+        if refresh.complete and not self.sitemap_unmodified:
+            refresh.deleted_ids = [product_id for product_id in state.hashes if product_id not in refresh.hashes]
+            # Every product was read, parsed or not, so this is a whole catalog snapshot.
+            if snapshot is not None:
+                await snapshot.commit()
+        else:
+            # Keep what we knew about products we didn't get to, or (skipped on their
+            # sitemap lastmod) whose ids we never saw this time.
+            refresh.hashes = {**state.hashes, **refresh.hashes}
+        return refresh
+
+    async def _fetch_brand_context(self) -> Optional[str]:
+        try:
+            homepage = await self._fetch_homepage()
+        except ValueError as e:
+            logger.warning(f"Keeping the stored brand context of {self.base_url}: {e}")
+            return None
+        return homepage.brand_context
+
+    async def _refresh(self, state: CrawlState) -> CatalogRefresh:
+        brand_context, refresh = await asyncio.gather(self._fetch_brand_context(), self._refresh_catalog(state))
+        refresh.brand_context = brand_context
+        return refresh
+
+    @contextlib.asynccontextmanager
+    async def _session(self):
+        """Provides the HTTP client for one run()/refresh()/stream() and records the scrape's metrics."""
+        started = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            async with self._client_scope():
+                yield self.client
+            outcome = "ok"
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            record_scrape(self.timings, self.progress, outcome, time.perf_counter() - started)
+
+    @contextlib.asynccontextmanager
+    async def _client_scope(self):
+        if self.shared_client is not None:
+            self.client = self.shared_client
+            try:
+                yield self.client
+            finally:
+                self.client = None
+            return
+        async with create_http_client() as client:
+            self.client = client
+            try:
+                yield client
+            finally:
+                self.client = None
+
+    async def run(self) -> BrandInsights:
+        """
+        Scrapes the store within a single timeout budget.
+        Raises asyncio.TimeoutError when the whole scrape exceeds `self.timeout` seconds.
+        """
+        async with self._session():
+            return await asyncio.wait_for(self._scrape(), timeout=self.timeout)
+
+    async def refresh(self, state: CrawlState) -> CatalogRefresh:
+        """
+        Re-crawls the catalog against the previous crawl's `state`, and the homepage for
+        the brand context. Products whose updated_at is not past the state's watermark
+        are skipped without hashing; the rest are hashed, and only new or changed ones
+        are parsed into Product models. Products missing from a complete crawl are
+        reported as deleted. Cached pages are revalidated with conditional GETs rather
+        than served while fresh, so a refresh never reports a stale catalog as unchanged.
+        """
+        self.revalidate = True
+        async with self._session():
+            return await asyncio.wait_for(self._refresh(state), timeout=self.timeout)
+
+    async def stream(self) -> AsyncIterator[dict]:
+        """
+        Yields the insights as JSON-ready records instead of one BrandInsights object:
+        brand-level sections first, then one "product" record per catalog product as
+        /products.json pages arrive, then contact details, FAQs and an "end" marker.
+        With `fields`, only the records for those sections are emitted; asking for
+        hero_products alone streams just the hero products, fetched one by one.
+        Only one catalog page is held in memory at a time. Unlike run(), a stream is
+        not bound by the overall scrape timeout; each fetch keeps its own timeout.
+        """
+        async with self._session():
+            records = self._stream_records()
+            try:
+                async for record in records:
+                    yield record
+            finally:
+                await records.aclose()
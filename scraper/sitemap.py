@@ -0,0 +1,71 @@
+"""
+Incremental sitemap.xml parsing.
+
+Shopify stores publish /sitemap.xml as a sitemap index whose children
+(sitemap_products_1.xml?from=...&to=..., ...) list one <url> per product with its
+<lastmod>. These documents can run to tens of megabytes on large stores, so they are
+parsed chunk by chunk as they download instead of being read into memory whole.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+from urllib.parse import urlsplit
+from xml.etree.ElementTree import XMLPullParser
+
+@dataclass
+class SitemapEntry:
+    loc: str
+    lastmod: Optional[str] = None
+    # True for a <sitemap> in a sitemap index, False for a <url> in a urlset.
+    is_index: bool = False
+
+def _local_name(tag: str) -> str:
+    return tag.rpartition('}')[2]
+
+def product_handle(loc: str) -> Optional[str]:
+    """The product handle of a /products/<handle> URL, or None for any other page."""
+    path = urlsplit(loc).path
+    if "/products/" not in path:
+        return None
+    handle = path.split("/products/")[-1].strip('/')
+    return handle if handle and '/' not in handle else None
+
+class SitemapParser:
+    """
+    Feed it a sitemap or sitemap index a chunk at a time; each call returns the
+    <url>/<sitemap> entries completed so far. Finished entries are dropped from the
+    tree as soon as they are read, so memory stays flat however long the document is.
+    """
+    def __init__(self):
+        self._parser = XMLPullParser(events=("start", "end"))
+        self._root = None
+
+    def feed(self, chunk: bytes) -> List[SitemapEntry]:
+        self._parser.feed(chunk)
+        return self._entries()
+
+    def close(self) -> List[SitemapEntry]:
+        self._parser.close()
+        return self._entries()
+
+    def _entries(self) -> List[SitemapEntry]:
+        entries = []
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = element
+                continue
+            tag = _local_name(element.tag)
+            if tag not in ("url", "sitemap"):
+                continue
+            loc = lastmod = None
+            for child in element:
+                name = _local_name(child.tag)
+                if name == "loc":
+                    loc = (child.text or "").strip()
+                elif name == "lastmod":
+                    lastmod = (child.text or "").strip() or None
+            if loc:
+                entries.append(SitemapEntry(loc=loc, lastmod=lastmod, is_index=tag == "sitemap"))
+            # Every earlier sibling is finished too; the parser keeps building under the root.
+            self._root.clear()
+        return entries
@@ -0,0 +1,184 @@
+"""
+Theme fingerprinting and per-theme extraction plans.
+
+Most stores run one of a handful of themes, and a theme marks up its FAQ accordions,
+homepage product sections and contact page the same way on every store that uses
+it. The homepage names its theme (`Shopify.theme = {...}`), so the scraper can pick
+that theme's selectors up front instead of applying one generic heuristic everywhere.
+Which FAQ layout actually matched is remembered per store and per theme
+(ExtractionPlans), so later scrapes parse a FAQ page down to that layout's items alone.
+"""
+import json
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Tuple
+from bs4 import SoupStrainer
+from fastapi import Request
+from models.pydantic_models import ExtractionPlanStats
+
+# Stores (and theme names) whose learned plan is kept, least recently used evicted first; 0 disables learning.
+THEME_PLAN_CACHE_SIZE = int(os.getenv("THEME_PLAN_CACHE_SIZE", "100000"))
+
+@dataclass(frozen=True)
+class FaqLayout:
+    """One FAQ markup: every `item_tag.item_class` element holds a question and its answer."""
+    item_tag: str
+    item_class: Optional[str]
+    question: str
+    answer: str
+
+    @property
+    def selector(self) -> str:
+        return f"{self.item_tag}.{self.item_class}" if self.item_class else self.item_tag
+
+    def strainer(self) -> SoupStrainer:
+        """Limits parsing to the item elements, so the rest of the page is never built into a tree."""
+        if not self.item_class:
+            return SoupStrainer(self.item_tag)
+        # While parsing, the strainer sees the raw class attribute, e.g. "faq__item is-open".
+        return SoupStrainer(self.item_tag, attrs={"class": re.compile(rf"(?:^|\s){re.escape(self.item_class)}(?:\s|$)")})
+
+FAQ_LAYOUTS: Dict[str, FaqLayout] = {
+    # The only markup read before theme detection, and still the only one for unrecognised themes.
+    "accordion": FaqLayout("details", "accordion__item", "summary", "div.accordion__content"),
+    # Dawn and the other Online Store 2.0 themes: collapsible content rows, whose <details> carry no class.
+    "collapsible_row": FaqLayout("details", None, "summary", "div.accordion__content"),
+    "prestige": FaqLayout("div", "Faq__Item", ".Faq__Question", ".Faq__Answer"),
+    # Archetype's themes (Impulse, Motion, Streamline).
+    "collapsible": FaqLayout("div", "collapsibles-wrapper", ".collapsible-trigger", ".collapsible-content"),
+    "warehouse": FaqLayout("div", "faq__item", ".faq__question", ".faq__answer"),
+}
+
+def _layouts_first(*preferred: str) -> Tuple[str, ...]:
+    return (*preferred, *(name for name in FAQ_LAYOUTS if name not in preferred))
+
+@dataclass(frozen=True)
+class ExtractionPlan:
+    """
+    What to look for, and where, on one store's pages. Picklable, so it travels to the
+    parse pool. The defaults read pages exactly as the scraper did before themes were
+    detected; only a recognised theme's plan narrows or widens that.
+    """
+    theme: Optional[str] = None
+    # FAQ_LAYOUTS names to try on a FAQ page, most likely first.
+    faq_layouts: Tuple[str, ...] = ("accordion",)
+    # The layout already seen to work for this store or theme; tried alone on a page parsed down to its items.
+    faq_layout: Optional[str] = None
+    # The homepage's content area. Product links outside it (menus, footer) are not hero products.
+    hero_sections: Optional[str] = None
+    # Contact page paths, preferred over any other link that mentions "contact".
+    contact_paths: Tuple[str, ...] = ()
+
+GENERIC_PLAN = ExtractionPlan()
+
+_CONTACT_PATHS = ("/pages/contact", "/pages/contact-us")
+_DAWN = ExtractionPlan(faq_layouts=_layouts_first("collapsible_row", "accordion"), hero_sections="#MainContent", contact_paths=_CONTACT_PATHS)
+_VINTAGE = ExtractionPlan(faq_layouts=tuple(FAQ_LAYOUTS), hero_sections="#MainContent", contact_paths=_CONTACT_PATHS)
+_ARCHETYPE = ExtractionPlan(faq_layouts=_layouts_first("collapsible"), hero_sections="#MainContent", contact_paths=_CONTACT_PATHS)
+
+# Keyed on the lower-cased theme name detect_theme() reports.
+THEME_PLANS: Dict[str, ExtractionPlan] = {
+    **{name: _DAWN for name in ("dawn", "sense", "craft", "crave", "refresh", "ride", "studio", "taste", "colorblock", "origin", "spotlight", "publisher", "trade")},
+    **{name: _VINTAGE for name in ("debut", "brooklyn", "minimal", "narrative", "simple", "supply", "venture", "boundless", "express")},
+    **{name: _ARCHETYPE for name in ("impulse", "motion", "streamline")},
+    "prestige": ExtractionPlan(faq_layouts=_layouts_first("prestige", "accordion"), hero_sections="#main", contact_paths=_CONTACT_PATHS),
+    "warehouse": ExtractionPlan(faq_layouts=_layouts_first("warehouse"), hero_sections="#main", contact_paths=_CONTACT_PATHS),
+}
+
+# Theme store ids survive a merchant renaming their copy of a theme.
+THEME_STORE_IDS = {887: "dawn", 796: "debut", 855: "prestige", 857: "impulse", 847: "motion", 872: "streamline", 871: "warehouse"}
+# Markers in a theme's own assets and markup, for homepages that don't set Shopify.theme.
+ASSET_MARKERS = ((b"prestige--v", "prestige"), (b"warehouse--v", "warehouse"), (b"component-card.css", "dawn"))
+
+_SHOPIFY_THEME_RE = re.compile(rb'Shopify\.theme\s*=\s*(\{[^{}]*\})')
+
+def detect_theme(content: bytes) -> Optional[str]:
+    """The lower-cased theme name of a homepage, or None if it can't be told."""
+    match = _SHOPIFY_THEME_RE.search(content)
+    if match:
+        try:
+            theme = json.loads(match.group(1))
+        except ValueError:
+            theme = None
+        if isinstance(theme, dict):
+            name = THEME_STORE_IDS.get(theme.get("theme_store_id")) or theme.get("schema_name") or theme.get("name")
+            if isinstance(name, str) and name.strip():
+                return name.strip().lower()
+    for marker, name in ASSET_MARKERS:
+        if marker in content:
+            return name
+    return None
+
+def resolve_plan(theme: Optional[str]) -> ExtractionPlan:
+    return replace(THEME_PLANS.get(theme, GENERIC_PLAN), theme=theme)
+
+class ExtractionPlans:
+    """
+    Remembers which FAQ layout matched, per store and per theme. A store's own entry
+    wins; otherwise a layout learned on another store with the same theme is tried
+    first. A store whose theme has changed since starts over from its new theme's plan.
+    """
+    def __init__(self, max_entries: int = THEME_PLAN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._stores: "OrderedDict[str, Tuple[Optional[str], str]]" = OrderedDict()
+        self._themes: "OrderedDict[str, str]" = OrderedDict()
+        self.store_hits = 0
+        self.theme_hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    def plan(self, store_url: str, theme: Optional[str]) -> ExtractionPlan:
+        plan = resolve_plan(theme)
+        entry = self._stores.get(store_url)
+        if entry is not None and entry[0] == theme:
+            self._stores.move_to_end(store_url)
+            self.store_hits += 1
+            return replace(plan, faq_layout=entry[1])
+        layout = self._themes.get(theme) if theme else None
+        if layout is not None:
+            self._themes.move_to_end(theme)
+            self.theme_hits += 1
+            return replace(plan, faq_layout=layout)
+        self.misses += 1
+        return plan
+
+    def learn(self, store_url: str, plan: ExtractionPlan, faq_layout: Optional[str]) -> None:
+        """Records the layout a FAQ page matched under `plan`; None when none did."""
+        if faq_layout is None:
+            self._stores.pop(store_url, None)
+            return
+        if plan.faq_layout is not None and faq_layout != plan.faq_layout:
+            # The known layout found nothing and the page had to be parsed in full.
+            self.fallbacks += 1
+        self._remember(self._stores, store_url, (plan.theme, faq_layout))
+        if plan.theme:
+            self._remember(self._themes, plan.theme, faq_layout)
+
+    def _remember(self, entries: OrderedDict, key: str, value) -> None:
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def stats(self) -> ExtractionPlanStats:
+        lookups = self.store_hits + self.theme_hits + self.misses
+        return ExtractionPlanStats(
+            stores=len(self._stores),
+            themes=len(self._themes),
+            store_hits=self.store_hits,
+            theme_hits=self.theme_hits,
+            misses=self.misses,
+            fallbacks=self.fallbacks,
+            hit_rate=(self.store_hits + self.theme_hits) / lookups if lookups else 0.0,
+        )
+
+def create_extraction_plans() -> Optional[ExtractionPlans]:
+    if THEME_PLAN_CACHE_SIZE <= 0:
+        return None
+    return ExtractionPlans(THEME_PLAN_CACHE_SIZE)
+
+# FastAPI dependency for the application-lifetime plan cache created at startup
+def get_extraction_plans(request: Request) -> Optional[ExtractionPlans]:
+    return request.app.state.extraction_plans
@@ -0,0 +1,106 @@
+import asyncio
+import math
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import httpx
+
+# Sustained requests per second allowed against a single host, and the burst above it (0 disables).
+RATE_LIMIT_PER_HOST = float(os.getenv("RATE_LIMIT_PER_HOST", "10"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+# Retries for a throttled or failing GET, with jittered exponential backoff between them.
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", "0.5"))
+# Longest we will wait before a retry; a longer Retry-After is returned to the caller as is.
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30"))
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Responses that mean the host wants us to slow down, not just that a request failed.
+THROTTLE_STATUSES = frozenset({429, 503})
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP-date), if any."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BACKOFF * 2 ** attempt))
+
+class HostThrottle:
+    """
+    Paces requests to one host with a token bucket, and caps how many may be open at
+    once with an AIMD window: the window grows by one request per window's worth of
+    successes and halves whenever the host throttles us. A throttled response also
+    pauses every request to the host until its Retry-After (or backoff) has passed.
+    """
+    def __init__(self, max_concurrency: int, rate: float = RATE_LIMIT_PER_HOST, burst: int = RATE_LIMIT_BURST):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.in_flight = 0
+        # Requests blocked in acquire(), which will take a slot once they get one.
+        self.waiting = 0
+        self.paused_until = 0.0
+        self._refilled_at = time.monotonic()
+        self._wakeup = asyncio.Event()
+
+    def _try_acquire(self) -> Optional[float]:
+        """Takes a slot and returns None, or returns how long to wait before trying again."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= int(self.limit):
+            return math.inf
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            self.tokens -= 1
+        self.in_flight += 1
+        return None
+
+    async def acquire(self) -> None:
+        self.waiting += 1
+        try:
+            while True:
+                wait = self._try_acquire()
+                if wait is None:
+                    return
+                # Nothing can release a slot between the check above and this clear.
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), None if wait == math.inf else wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.waiting -= 1
+
+    def idle(self) -> bool:
+        """True when nothing holds or waits for a slot and no pause is pending, so the throttle can be dropped."""
+        return not self.in_flight and not self.waiting and time.monotonic() >= self.paused_until
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wakeup.set()
+
+    def succeeded(self) -> None:
+        self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def throttled(self, delay: float) -> None:
+        self.limit = max(1.0, self.limit / 2)
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
@@ -0,0 +1,8 @@
+import os
+
+# Set before any test module imports the scraper, which reads these at import time.
+# Only the per-host window and Retry-After pauses should shape the throttled runs.
+os.environ.setdefault("RATE_LIMIT_PER_HOST", "0")
+os.environ.setdefault("HTTP_RETRIES", "20")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("PRICE_HISTORY_DIR", "")
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import httpx
+from scraper.cache import CachedResponse, DiskCache, MemoryCache
+from scraper.scraper import ShopifyScraper
+
+HOMEPAGE = b'<html><head><meta name="description" content="A store"></head></html>'
+
+class Store:
+    """Serves the homepage with an ETag and answers a matching If-None-Match with a 304."""
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=HOMEPAGE, headers={"ETag": '"v1"'})
+
+def scrape_twice(cache) -> Store:
+    store = Store()
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(store)) as client:
+            for _ in range(2):
+                insights = await ShopifyScraper("https://store.example.com", client=client, cache=cache, fields=["brand_context"]).run()
+                assert insights.brand_context == "A store"
+
+    asyncio.run(run())
+    return store
+
+def entry(content: bytes, stored_at: float = 0.0) -> CachedResponse:
+    return CachedResponse(content=content, stored_at=stored_at)
+
+def test_a_fresh_entry_is_served_without_a_request():
+    store = scrape_twice(MemoryCache(ttl=60))
+    assert store.requests == [None]
+
+def test_a_stale_entry_is_revalidated_and_a_304_serves_it():
+    cache = MemoryCache(ttl=0)
+    store = scrape_twice(cache)
+    assert store.requests == [None, '"v1"']
+    stored = asyncio.run(cache.get("https://store.example.com"))
+    assert stored.content == HOMEPAGE and stored.stored_at > 0
+
+def test_memory_cache_evicts_least_recently_used_bytes():
+    async def run():
+        cache = MemoryCache(max_bytes=100)
+        await cache.set("a", entry(b"a" * 40))
+        await cache.set("b", entry(b"b" * 40))
+        await cache.get("a")
+        await cache.set("c", entry(b"c" * 40))
+        assert await cache.get("b") is None
+        assert (await cache.get("a")).content == b"a" * 40
+        assert cache.current_bytes == 80
+        # An entry larger than the whole budget is never stored.
+        await cache.set("d", entry(b"d" * 101))
+        assert await cache.get("d") is None
+
+    asyncio.run(run())
+
+def test_disk_cache_round_trips_and_evicts_least_recently_used_files(tmp_path):
+    async def run():
+        # Each file is about 190 bytes with its header, so the third one goes over budget.
+        cache = DiskCache(str(tmp_path), max_bytes=500)
+        await cache.set("https://a.example.com", CachedResponse(content=b"a" * 100, etag='"a"', stored_at=1.0))
+        await cache.set("https://b.example.com", entry(b"b" * 100))
+        os.utime(cache._path("https://a.example.com"), (1000, 1000))
+        os.utime(cache._path("https://b.example.com"), (2000, 2000))
+        # Reading a touches it, so b is now the least recently used.
+        read = await cache.get("https://a.example.com")
+        assert (read.content, read.etag, read.stored_at) == (b"a" * 100, '"a"', 1.0)
+        await cache.set("https://c.example.com", entry(b"c" * 100))
+        assert await cache.get("https://b.example.com") is None
+        assert await cache.get("https://a.example.com") is not None
+        assert await cache.get("https://c.example.com") is not None
+        assert cache.current_bytes <= 500 * 0.9
+
+    asyncio.run(run())
+
+def test_disk_cache_misses_when_the_file_holds_another_url(tmp_path):
+    async def run():
+        cache = DiskCache(str(tmp_path))
+        await cache.set("https://a.example.com", entry(b"a"))
+        os.replace(cache._path("https://a.example.com"), cache._path("https://b.example.com"))
+        assert await cache.get("https://b.example.com") is None
+
+    asyncio.run(run())
@@ -0,0 +1,50 @@
+import asyncio
+import httpx
+from scraper.scraper import PRODUCTS_PAGE_LIMIT, ShopifyScraper
+
+def items(ids):
+    return [{"id": i, "title": f"Product {i}", "vendor": "V", "product_type": "T", "handle": f"product-{i}", "variants": [{"id": 10_000 + i, "price": "1.00"}]} for i in ids]
+
+def scrape(handler, **options):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await ShopifyScraper("https://store.example.com", client=client, fields=["product_catalog"], **options).run()
+    return asyncio.run(run())
+
+def test_pages_are_prefetched_in_a_window_that_starts_at_one_and_doubles():
+    pages = 8
+    in_flight = 0
+    starts = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight
+        page = int(request.url.params["page"])
+        starts.append((page, in_flight))
+        in_flight += 1
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        first = (page - 1) * PRODUCTS_PAGE_LIMIT
+        return httpx.Response(200, json={"products": items(range(first, first + PRODUCTS_PAGE_LIMIT)) if page <= pages else []})
+
+    insights = scrape(handler, catalog_prefetch=4)
+    assert len({product.id for product in insights.product_catalog}) == pages * PRODUCTS_PAGE_LIMIT
+    # Page 1 goes out alone, so a one-page store costs a single request.
+    assert starts[0] == (1, 0)
+    # The window grows to catalog_prefetch requests in flight, and no further.
+    assert max(concurrent for _, concurrent in starts) + 1 == 4
+    assert {page for page, _ in starts} >= set(range(1, pages + 2))
+
+def test_a_store_that_ignores_page_falls_back_to_since_id():
+    catalog = list(range(1, 601))
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        since_id = request.url.params.get("since_id")
+        requested.append("since_id" if since_id is not None else "page")
+        # ?page= is ignored: every page is the first one.
+        after = [i for i in catalog if i > int(since_id or 0)]
+        return httpx.Response(200, json={"products": items(after[:PRODUCTS_PAGE_LIMIT])})
+
+    insights = scrape(handler, catalog_prefetch=1)
+    assert sorted(product.id for product in insights.product_catalog) == catalog
+    assert requested == ["page", "page", "since_id", "since_id", "since_id"]
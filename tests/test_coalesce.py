@@ -0,0 +1,44 @@
+import asyncio
+import httpx
+from scraper.coalesce import SingleFlight
+from scraper.scraper import ShopifyScraper
+
+def coalesced_scrapes(status: int, urls):
+    """Scrapes every URL at once through one SingleFlight; returns the outcomes, homepage requests made and the flights' stats."""
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url)
+        # Slow enough that every scrape starts while the first is in flight.
+        await asyncio.sleep(0.05)
+        return httpx.Response(status, html='<html><head><meta name="description" content="A store"></head></html>')
+
+    async def run():
+        flights = SingleFlight()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            scrapers = [ShopifyScraper(url, client=client, fields=["brand_context"]) for url in urls]
+            results = await asyncio.gather(*(flights.run(scraper) for scraper in scrapers), return_exceptions=True)
+        return results, flights.stats()
+
+    results, stats = asyncio.run(run())
+    return results, requests, stats
+
+def test_concurrent_scrapes_of_one_store_share_a_single_result():
+    # The same store, spelled three ways.
+    results, requests, stats = coalesced_scrapes(200, ["https://store.example.com", "https://store.example.com/", "https://STORE.example.com"])
+    assert len(requests) == 1
+    assert results[0].brand_context == "A store"
+    assert all(result is results[0] for result in results)
+    assert (stats.requests, stats.coalesced, stats.in_flight) == (3, 2, 0)
+
+def test_concurrent_scrapes_of_one_store_share_a_single_error():
+    results, requests, stats = coalesced_scrapes(404, ["https://store.example.com"] * 3)
+    assert len(requests) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    assert all(result is results[0] for result in results)
+    assert stats.in_flight == 0
+
+def test_different_stores_are_not_coalesced():
+    results, requests, stats = coalesced_scrapes(200, ["https://a.example.com", "https://b.example.com"])
+    assert len(requests) == 2
+    assert stats.coalesced == 0
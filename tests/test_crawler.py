@@ -0,0 +1,36 @@
+from jobs.crawler import read_checkpoint, read_urls, shard
+from models.pydantic_models import BatchScrapeResult
+
+def result_line(url: str, ok: bool) -> str:
+    return BatchScrapeResult(website_url=url, ok=ok, error=None if ok else "boom").model_dump_json() + "\n"
+
+def test_read_checkpoint_truncates_a_half_written_last_line(tmp_path):
+    path = tmp_path / "crawl.jsonl"
+    complete = result_line("https://a.example.com", True) + result_line("https://b.example.com", False)
+    path.write_text(complete + result_line("https://c.example.com", True)[:30])
+
+    assert read_checkpoint(str(path), retry_failed=False) == {"https://a.example.com/", "https://b.example.com/"}
+    assert path.read_text() == complete
+
+def test_read_checkpoint_leaves_failed_stores_to_retry_and_the_last_line_wins(tmp_path):
+    path = tmp_path / "crawl.jsonl"
+    path.write_text(
+        result_line("https://a.example.com", True)
+        + result_line("https://b.example.com", False)
+        + result_line("https://c.example.com", False)
+        + result_line("https://c.example.com", True)
+    )
+    assert read_checkpoint(str(path), retry_failed=True) == {"https://a.example.com/", "https://c.example.com/"}
+
+def test_read_checkpoint_of_a_new_crawl_is_empty(tmp_path):
+    assert read_checkpoint(str(tmp_path / "missing.jsonl"), retry_failed=False) == set()
+
+def test_read_urls_normalizes_and_deduplicates():
+    lines = ["# stores", "", "a.example.com", "https://a.example.com/", "http://b.example.com", "not a url at all"]
+    assert read_urls(lines) == ["https://a.example.com/", "http://b.example.com/"]
+
+def test_every_store_of_a_host_lands_in_one_shard():
+    urls = [f"https://store{i}.example.com/" for i in range(50)] + ["https://store7.example.com/"]
+    shards = shard(urls, 4)
+    assert sorted(url for part in shards for url in part) == sorted(urls)
+    assert sum("https://store7.example.com/" in part for part in shards) == 1
@@ -0,0 +1,59 @@
+import asyncio
+import httpx
+import pytest
+from scraper.scraper import ShopifyScraper
+
+HOMEPAGE = b"""<html><head><meta name="description" content="A store"></head><body>
+<a href="/pages/contact">Contact</a><a href="/pages/faq">FAQ</a><a href="https://instagram.com/store">Instagram</a>
+<a href="/products/hero">Hero</a>
+</body></html>"""
+FAQ_PAGE = b'<details class="accordion__item"><summary>Q?</summary><div class="accordion__content">A.</div></details>'
+PRODUCT = {"id": 1, "title": "Hero", "vendor": "V", "product_type": "T", "handle": "hero", "variants": [{"id": 2, "price": "5.00"}]}
+
+def scrape(fields):
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        requested.append(path)
+        if path == "/":
+            return httpx.Response(200, content=HOMEPAGE)
+        if path == "/products.json":
+            return httpx.Response(200, json={"products": [PRODUCT] if request.url.params.get("page") == "1" else []})
+        if path == "/products/hero.json":
+            return httpx.Response(200, json={"product": PRODUCT})
+        if path == "/pages/faq":
+            return httpx.Response(200, content=FAQ_PAGE)
+        if path == "/pages/contact":
+            return httpx.Response(200, content=b"<p>hello@store.example.com</p>")
+        return httpx.Response(404)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await ShopifyScraper("https://store.example.com", client=client, fields=fields).run()
+
+    return asyncio.run(run()), requested
+
+@pytest.mark.parametrize("fields, pages", [
+    (["brand_context", "social_handles", "important_links"], ["/"]),
+    (["product_catalog"], ["/products.json"]),
+    (["faqs"], ["/", "/pages/faq"]),
+    (["contact_details"], ["/", "/pages/contact"]),
+    (["hero_products"], ["/", "/products/hero.json"]),
+])
+def test_only_the_pages_the_fields_need_are_fetched(fields, pages):
+    insights, requested = scrape(fields)
+    assert sorted(set(requested)) == sorted(pages)
+    assert set(insights.model_dump(exclude_defaults=True)) == {"store_url", *fields}
+
+def test_every_section_by_default():
+    insights, requested = scrape(None)
+    assert {"/", "/products.json", "/pages/faq", "/pages/contact"} <= set(requested)
+    assert insights.brand_context == "A store"
+    assert [product.id for product in insights.hero_products] == [1]
+    assert insights.faqs[0].question == "Q?"
+    assert insights.contact_details.emails == ["hello@store.example.com"]
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError):
+        ShopifyScraper("https://store.example.com", fields=["brand_context", "pricing"])
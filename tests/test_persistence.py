@@ -0,0 +1,97 @@
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import sessionmaker
+from crud import operations
+from database import migrations
+from models import db_models
+from models.pydantic_models import BrandInsights
+from scraper.crawl_state import CatalogRefresh, product_hash
+from scraper.scraper import ShopifyScraper
+
+STORE_URL = "https://store.example.com/"
+
+# The brands and products tables as the first release created them.
+BASELINE_SCHEMA = (
+    "CREATE TABLE brands (id INTEGER PRIMARY KEY, store_url VARCHAR(255) UNIQUE, brand_context VARCHAR(2000))",
+    "CREATE TABLE products (id INTEGER PRIMARY KEY, shopify_product_id INTEGER UNIQUE, title VARCHAR(255), vendor VARCHAR(255), price FLOAT, brand_id INTEGER REFERENCES brands(id))",
+    # Added by hand, as an earlier README told operators to.
+    "ALTER TABLE products ADD COLUMN content_hash BIGINT",
+)
+
+def items(prices):
+    return [
+        {"id": i, "title": f"Product {i}", "vendor": "V", "product_type": "T", "handle": f"product-{i}", "variants": [{"id": 1000 + i, "price": price}]}
+        for i, price in enumerate(prices, start=1)
+    ]
+
+def products(prices):
+    return ShopifyScraper(STORE_URL)._parse_products(items(prices))
+
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    db_models.Base.metadata.create_all(bind=engine)
+    written = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_product_writes(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO products"):
+            written.append(len(parameters) if executemany else 1)
+
+    return sessionmaker(bind=engine)(), written
+
+def test_migrations_upgrade_an_existing_database_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.execute(text(statement))
+
+    pending = migrations.prepare_schema(engine)
+    assert [migration.version for migration in pending] == [1, 2, 3, 4]
+    applied = migrations.upgrade(engine)
+    assert [migration.version for migration in applied] == [1, 2, 3, 4]
+
+    schema = inspect(engine)
+    assert {"catalog_watermark", "tracked", "next_crawl_at", "crawl_failures"} <= {column["name"] for column in schema.get_columns("brands")}
+    assert {"content_hash", "product_type"} <= {column["name"] for column in schema.get_columns("products")}
+    assert {"ix_products_brand_vendor", "ix_products_brand_price"} <= {index["name"] for index in schema.get_indexes("products")}
+    assert "ix_brands_tracked_next_crawl" in {index["name"] for index in schema.get_indexes("brands")}
+
+    assert migrations.upgrade(engine) == []
+    assert migrations.prepare_schema(engine) == []
+
+def test_a_new_database_is_stamped_with_the_latest_version(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    assert migrations.prepare_schema(engine) == []
+    with engine.connect() as connection:
+        assert migrations.current_version(connection) == migrations.LATEST_VERSION
+
+def test_saving_insights_again_writes_only_changed_products(tmp_path):
+    db, written = session(tmp_path)
+    catalog = products(["5.00", "6.00", "7.00"])
+    operations.create_brand_insights(db, BrandInsights(store_url=STORE_URL, brand_context="A store", product_catalog=catalog, hero_products=catalog[:1]))
+    assert sum(written) == 3
+
+    written.clear()
+    operations.create_brand_insights(db, BrandInsights(store_url=STORE_URL, product_catalog=products(["5.00", "6.50", "7.00"])))
+    assert sum(written) == 1
+    stored = dict(db.query(db_models.Product.shopify_product_id, db_models.Product.price))
+    assert stored == {1: 5.0, 2: 6.5, 3: 7.0}
+    # A save without a brand context keeps the stored one.
+    assert operations.get_stored_brand(db, operations.find_brand(db, [STORE_URL])).brand_context == "A store"
+
+def test_a_refresh_upserts_changes_deletes_and_leaves_hashes_a_full_save_agrees_with(tmp_path):
+    db, written = session(tmp_path)
+    raw = items(["5.00", "6.00", "7.00"])
+    operations.apply_catalog_refresh(db, STORE_URL, CatalogRefresh(
+        changed=products(["5.00", "6.00", "7.00"]),
+        hashes={item["id"]: product_hash(item) for item in raw},
+        watermark="2024-01-01T00:00:00Z",
+        brand_context="A store",
+    ))
+    operations.apply_catalog_refresh(db, STORE_URL, CatalogRefresh(deleted_ids=[3], hashes={1: product_hash(raw[0]), 2: product_hash(raw[1])}, unchanged=2, watermark="2024-01-01T00:00:00Z"))
+    assert sorted(id for id, in db.query(db_models.Product.shopify_product_id)) == [1, 2]
+    db_brand = operations.find_brand(db, [STORE_URL])
+    assert (db_brand.brand_context, db_brand.catalog_watermark) == ("A store", "2024-01-01T00:00:00Z")
+
+    written.clear()
+    operations.create_brand_insights(db, BrandInsights(store_url=STORE_URL, product_catalog=products(["5.00", "6.00"])))
+    assert sum(written) == 0
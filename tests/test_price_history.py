@@ -0,0 +1,88 @@
+import asyncio
+import httpx
+import numpy as np
+from scraper.crawl_state import CrawlState
+from scraper.price_history import SNAPSHOT_DTYPE, PriceHistory, compare_snapshots
+from scraper.scraper import ShopifyScraper
+
+VENDORS = ["Acme", "Globex"]
+
+def snapshot(*rows):
+    """(product_id, variant_id, price_cents, vendor, available) rows, sorted by variant_id as stored."""
+    return np.sort(np.array(list(rows), dtype=SNAPSHOT_DTYPE), order="variant_id")
+
+def test_compare_snapshots_reports_moves_new_and_removed_products_and_vendor_stats():
+    old = snapshot(
+        (1, 10, 1000, 0, True),
+        (1, 11, 2000, 0, True),
+        (2, 20, 0, 1, False),
+        (3, 30, 500, 1, True),
+    )
+    new = snapshot(
+        (1, 10, 1000, 0, True),
+        (1, 11, 1500, 0, True),
+        (2, 20, 300, 1, True),
+        (4, 40, 700, 1, True),
+    )
+    changes = compare_snapshots(old, new, VENDORS, limit=10)
+
+    assert changes["variants_compared"] == 3
+    assert changes["price_changes_total"] == 2
+    moves = {change.variant_id: change for change in changes["price_changes"]}
+    assert (moves[11].old_price, moves[11].new_price, moves[11].change, moves[11].change_pct) == (20.0, 15.0, -5.0, -25.0)
+    # A move from a zero price has no percentage.
+    assert (moves[20].vendor, moves[20].change, moves[20].change_pct) == ("Globex", 3.0, None)
+    assert (changes["new_product_ids"], changes["removed_product_ids"]) == ([4], [3])
+    assert (changes["became_available"], changes["became_unavailable"]) == (1, 0)
+
+    acme, globex = changes["vendors"]
+    assert (acme.vendor, acme.variants, acme.mean_price, acme.median_price, acme.min_price, acme.max_price) == ("Acme", 2, 12.5, 12.5, 10.0, 15.0)
+    assert (acme.price_changes, acme.mean_change_pct) == (1, -25.0)
+    assert (globex.variants, globex.median_price, globex.price_changes, globex.mean_change_pct) == (2, 5.0, 1, None)
+
+def test_compare_snapshots_limits_the_listed_changes_but_not_the_totals():
+    old = snapshot(*((i, i, 100, 0, True) for i in range(1, 6)))
+    new = snapshot(*((i, i, 100 + i, 0, True) for i in range(1, 6)))
+    changes = compare_snapshots(old, new, VENDORS, limit=2)
+    assert changes["price_changes_total"] == 5
+    assert [change.variant_id for change in changes["price_changes"]] == [5, 4]
+
+def test_an_unchanged_catalog_confirms_the_last_snapshot(tmp_path):
+    history = PriceHistory(str(tmp_path))
+    store_url = "https://store.example.com/"
+
+    def record(price):
+        writer = history.writer(store_url)
+        writer.add_items([{"id": 1, "vendor": "Acme", "variants": [{"id": 10, "price": price, "available": True}]}])
+        asyncio.run(writer.commit())
+
+    record("10.00")
+    record("10.00")
+    assert history.price_changes(store_url) is None
+    assert "confirmed_at" in history._read_index(store_url)["snapshots"][0]
+    record("12.50")
+    changes = history.price_changes(store_url)
+    assert changes.snapshots == 2
+    assert [(change.old_price, change.new_price) for change in changes.price_changes] == [(10.0, 12.5)]
+
+def test_refreshes_record_snapshots_including_products_they_skip(tmp_path):
+    history = PriceHistory(str(tmp_path))
+    price = "10.00"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path != "/products.json":
+            return httpx.Response(404)
+        # updated_at never moves, so the second refresh skips the product without parsing it.
+        item = {"id": 1, "title": "T", "vendor": "Acme", "product_type": "P", "handle": "t", "updated_at": "2024-01-01T00:00:00Z", "variants": [{"id": 10, "price": price}]}
+        return httpx.Response(200, json={"products": [item] if request.url.params.get("page") == "1" else []})
+
+    async def refresh(state):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await ShopifyScraper("https://store.example.com", client=client, price_history=history).refresh(state)
+
+    first = asyncio.run(refresh(CrawlState()))
+    price = "12.50"
+    second = asyncio.run(refresh(CrawlState(watermark=first.watermark, hashes=first.hashes)))
+    assert (second.changed, second.unchanged) == ([], 1)
+    changes = history.price_changes("https://store.example.com/")
+    assert [(change.old_price, change.new_price) for change in changes.price_changes] == [(10.0, 12.5)]
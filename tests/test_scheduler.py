@@ -0,0 +1,65 @@
+import asyncio
+import time
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from crud import operations
+from jobs.scheduler import RecrawlScheduler, failure_delay, jittered, next_interval
+from models import db_models
+
+def test_next_interval_halves_on_change_grows_otherwise_and_stays_in_bounds():
+    assert next_interval(3600, changed=True, min_interval=900, max_interval=86400) == 1800
+    assert next_interval(3600, changed=False, min_interval=900, max_interval=86400) == 5400
+    assert next_interval(1000, changed=True, min_interval=900, max_interval=86400) == 900
+    assert next_interval(80000, changed=False, min_interval=900, max_interval=86400) == 86400
+
+def test_failures_back_off_exponentially_up_to_the_longest_interval():
+    assert [failure_delay(3600, failures, max_interval=86400) for failures in (1, 2, 3)] == [7200, 14400, 28800]
+    assert failure_delay(3600, 10, max_interval=86400) == 86400
+    # A long failure streak never overflows.
+    assert failure_delay(3600, 10_000, max_interval=86400) == 86400
+
+def test_jitter_stays_within_ten_percent():
+    assert all(900 <= jittered(1000) <= 1100 for _ in range(1000))
+
+def crawl(tmp_path, status: int, failures: int = 0):
+    """Runs one scheduled crawl of a tracked store answering `status`; returns its brand row."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    db_models.Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    store_url = "https://store.example.com/"
+    operations.track_brand(db, store_url, 3600, time.time())
+    brand_id = operations.find_brand(db, [store_url]).id
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/products.json" and status == 200:
+            products = [{"id": 1, "title": "T", "vendor": "V", "product_type": "P", "handle": "t", "variants": [{"id": 2, "price": "1.00"}]}]
+            return httpx.Response(200, json={"products": products if request.url.params.get("page") == "1" else []})
+        return httpx.Response(status)
+
+    async def run():
+        scheduler = RecrawlScheduler(session_factory=session_factory)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            scheduler._scraper_options = {"client": client}
+            await scheduler._crawl(brand_id, store_url, 3600, failures)
+        return scheduler
+
+    started = time.time()
+    scheduler = asyncio.run(run())
+    db.expire_all()
+    return scheduler, operations.find_brand(db, [store_url]), started
+
+def test_a_crawl_with_changes_shortens_the_interval(tmp_path):
+    scheduler, brand, started = crawl(tmp_path, 200)
+    assert (scheduler.crawls, scheduler.crawls_with_changes, scheduler.products_changed) == (1, 1, 1)
+    assert (brand.recrawl_interval, brand.crawl_failures) == (1800, 0)
+    assert brand.last_changed_at >= started
+    assert started + 1800 * 0.9 <= brand.next_crawl_at <= time.time() + 1800 * 1.1
+
+def test_a_failed_crawl_backs_off_and_keeps_the_interval(tmp_path):
+    scheduler, brand, started = crawl(tmp_path, 500, failures=1)
+    assert scheduler.failures == 1
+    assert brand.crawl_failures == 2
+    assert brand.recrawl_interval == 3600
+    assert started + 4 * 3600 * 0.9 <= brand.next_crawl_at <= time.time() + 4 * 3600 * 1.1
@@ -0,0 +1,38 @@
+import asyncio
+import httpx
+from benchmarks.fixture_store import FixtureStore
+from scraper.http_client import create_http_client
+from scraper.scraper import ShopifyScraper
+
+def test_sitemap_catalog_completes_on_a_throttled_store():
+    # 429s shrink the host's window to a single slot; an open sitemap download must not keep it.
+    async def scrape(url: str):
+        async with create_http_client() as client:
+            return await ShopifyScraper(url, client=client, fields=["product_catalog"], timeout=60).run()
+
+    with FixtureStore(products=1000, products_json=False, throttle_rate=0.3, retry_after=0.01) as fixture:
+        insights = asyncio.run(scrape(fixture.url(0)))
+        assert fixture.throttles_injected > 0
+    assert len(insights.product_catalog) == 1000
+    assert insights.degraded_sections == []
+
+def test_products_json_server_error_degrades_instead_of_reading_the_sitemap():
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        if request.url.path == "/products.json":
+            return httpx.Response(502)
+        if request.url.path == "/":
+            return httpx.Response(200, html='<html><head><meta name="description" content="A store"></head></html>')
+        return httpx.Response(404)
+
+    async def scrape():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await ShopifyScraper("https://store.example.com", client=client, fields=["brand_context", "product_catalog"]).run()
+
+    insights = asyncio.run(scrape())
+    assert insights.brand_context == "A store"
+    assert insights.product_catalog == []
+    assert insights.degraded_sections == ["product_catalog"]
+    assert "/sitemap.xml" not in requested
@@ -0,0 +1,37 @@
+from scraper.extractor import check_parity, extract_homepage, make_soup, parse_faqs
+from scraper.themes import GENERIC_PLAN, detect_theme, resolve_plan
+
+BASE_URL = "https://store.example.com"
+
+def homepage(theme: str = "") -> bytes:
+    return f"""<html><head>{theme}<meta name="description" content="A store"></head><body>
+<header><a href="/pages/about">Contact: mail us</a><a href="/products/menu-item">Menu item</a></header>
+<main id="MainContent"><a href="/products/hero">Hero</a></main>
+<footer><a href="/pages/contact">Contact</a></footer>
+</body></html>""".encode()
+
+DAWN = homepage('<script>Shopify.theme = {"name":"My Dawn","theme_store_id":887};</script>')
+
+FAQ_PAGE = b"""<html><body>
+<details><summary>Plain row?</summary><div class="accordion__content">Only Dawn reads this.</div></details>
+</body></html>"""
+
+def test_generic_plan_reads_the_homepage_as_the_per_section_extractors_do():
+    assert detect_theme(homepage()) is None
+    assert check_parity(BASE_URL, homepage()) == []
+    data = extract_homepage(make_soup(homepage()), BASE_URL, resolve_plan(None))
+    assert data.hero_handles == ["menu-item", "hero"]
+    assert data.links["contact_us"] == f"{BASE_URL}/pages/about"
+
+def test_a_recognised_theme_narrows_hero_products_and_prefers_its_contact_path():
+    plan = resolve_plan(detect_theme(DAWN))
+    assert plan.theme == "dawn"
+    data = extract_homepage(make_soup(DAWN), BASE_URL, plan)
+    assert data.hero_handles == ["hero"]
+    assert data.links["contact_us"] == f"{BASE_URL}/pages/contact"
+
+def test_only_a_recognised_theme_reads_classless_faq_rows():
+    assert parse_faqs(FAQ_PAGE, GENERIC_PLAN).items == []
+    page = parse_faqs(FAQ_PAGE, resolve_plan("dawn"))
+    assert page.items == [("Plain row?", "Only Dawn reads this.")]
+    assert page.layout == "collapsible_row"
@@ -0,0 +1,102 @@
+import asyncio
+from email.utils import formatdate
+import time
+import httpx
+import pytest
+from scraper.http_client import HostLimitedTransport
+from scraper.throttle import HostThrottle, retry_after
+
+def test_retry_after_reads_seconds_and_http_dates():
+    assert retry_after(httpx.Response(429, headers={"Retry-After": "7"})) == 7.0
+    assert retry_after(httpx.Response(429, headers={"Retry-After": "-3"})) == 0.0
+    date = retry_after(httpx.Response(503, headers={"Retry-After": formatdate(time.time() + 60, usegmt=True)}))
+    assert 55 < date <= 60
+    assert retry_after(httpx.Response(503, headers={"Retry-After": formatdate(time.time() - 60, usegmt=True)})) == 0.0
+    assert retry_after(httpx.Response(429, headers={"Retry-After": "soon"})) is None
+    assert retry_after(httpx.Response(429)) is None
+
+def send(statuses, method="GET", retries=3):
+    """Sends one request through a HostLimitedTransport whose host answers `statuses` in turn; returns (status, requests made, transport)."""
+    answers = iter(statuses)
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(next(answers), headers={"Retry-After": "0"})
+
+    transport = HostLimitedTransport(httpx.MockTransport(handler), per_host=4, retries=retries)
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            response = await client.request(method, "https://store.example.com/products.json")
+            return response.status_code
+
+    return asyncio.run(run()), len(calls), transport
+
+@pytest.mark.parametrize("status", [429, 502, 503, 504])
+def test_throttled_and_failing_gets_are_retried(status):
+    final, calls, transport = send([status, status, 200])
+    assert (final, calls) == (200, 3)
+    assert transport._throttles["store.example.com"].in_flight == 0
+
+def test_retries_stop_at_the_limit_and_skip_other_errors_and_methods():
+    assert send([429] * 5, retries=2)[:2] == (429, 3)
+    assert send([500, 200])[:2] == (500, 1)
+    assert send([503, 200], method="POST")[:2] == (503, 1)
+
+def test_the_window_halves_on_throttling_and_grows_back_additively():
+    throttle = HostThrottle(8, rate=0)
+    throttle.throttled(0)
+    assert throttle.limit == 4
+    throttle.throttled(0)
+    throttle.throttled(0)
+    throttle.throttled(0)
+    assert throttle.limit == 1
+    # Each success adds 1/limit, about one request more per window's worth of successes.
+    throttle.succeeded()
+    assert throttle.limit == 2
+    throttle.succeeded()
+    throttle.succeeded()
+    assert throttle.limit == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    for _ in range(100):
+        throttle.succeeded()
+    assert throttle.limit == 8
+
+def test_a_throttled_response_pauses_the_host():
+    throttle = HostThrottle(4, rate=0)
+    throttle.throttled(60)
+    assert throttle._try_acquire() > 59
+    assert not throttle.idle()
+
+class _FailingClose(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b""
+
+    async def aclose(self) -> None:
+        raise RuntimeError("connection reset while closing")
+
+def test_the_host_slot_is_released_when_closing_a_retried_response_fails():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(429, headers={"Retry-After": "0"}, stream=_FailingClose())
+
+    transport = HostLimitedTransport(httpx.MockTransport(handler), per_host=1)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await transport.handle_async_request(httpx.Request("GET", "https://store.example.com/"))
+
+    asyncio.run(run())
+    throttle = transport._throttles["store.example.com"]
+    assert (throttle.in_flight, throttle.limit) == (0, 1.0)
+
+def test_a_new_host_is_never_evicted_in_favour_of_busy_ones():
+    transport = HostLimitedTransport(httpx.MockTransport(lambda request: httpx.Response(200)), per_host=1, max_hosts=2)
+    for host in ("a", "b"):
+        transport._throttle(host).in_flight = 1
+    new = transport._throttle("c")
+    assert transport._throttle("c") is new
+    # Once idle, the least recently used host makes room.
+    transport._throttle("a").in_flight = 0
+    transport._throttle("b")
+    transport._throttle("d")
+    assert "a" not in transport._throttles